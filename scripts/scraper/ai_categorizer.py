@@ -5,14 +5,27 @@ Given a batch of template summaries (id, title, description, tags, node_types),
 calls the OpenAI API in sub-batches and returns a mapping of id -> category.
 
 The model is constrained to choose from a fixed list of allowed categories.
+Results are memoized in category_cache, so unchanged items are not re-sent.
+Items are packed into requests up to a token budget (AI_BATCH_TOKEN_BUDGET) rather than
+a fixed count. Responses are requested as schema-constrained JSON, parsed leniently, and ids the
+model leaves out are re-asked on their own. Sub-batches are dispatched concurrently (up to AI_MAX_CONCURRENCY in flight); the
+in-flight limit adapts to 429s and rate-limit headers, and a failed sub-batch is
+retried on its own.
 """
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
+import re
 import time
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from category_cache import get_category_cache, item_key
+from json_codec import loads
+from rate_limit import AdaptiveConcurrency
 
 try:
     # New-style OpenAI client (openai>=1.0)
@@ -69,6 +82,65 @@ ALLOWED_CATEGORIES: List[str] = [
     "Other",
 ]
 
+SYSTEM_PROMPT = (
+    "You are an expert product categorizer for workflow automations. "
+    "For each item, choose exactly ONE category from the allowed list that best "
+    "describes the primary purpose of the workflow. "
+    "Respond with a JSON object {\"results\": [...]} whose array holds one object per item, "
+    "each with fields 'id' and 'category'. "
+    "The 'category' MUST be one of the allowed_categories exactly, and you must "
+    "return the same number of items, in the same order, as the input."
+)
+
+# Rate-limited responses are retried (after Retry-After) this many times, separately from error retries.
+MAX_THROTTLE_RETRIES = 6
+
+# Ids missing from a response are re-sent on their own this many times.
+MAX_REASKS = 2
+
+# Schema-constrained output (OpenAI structured outputs): categories can only be allowed ones.
+RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "template_categories",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "category": {"type": "string", "enum": ALLOWED_CATEGORIES},
+                        },
+                        "required": ["id", "category"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Cleared after the first 400 for response_format so the rest of the run sends plain requests.
+_structured_output_available = True
+
+_OBJECT_RE = re.compile(r"\{[^{}]*\}")
+
+CHARS_PER_TOKEN = 4
+# Each answer ({"id": ..., "category": ...}) is counted against the budget too.
+OUTPUT_TOKENS_PER_ITEM = 20
+
+# Part of every cache key: editing the prompt or the category list invalidates cached answers.
+PROMPT_VERSION = hashlib.sha256(json.dumps([SYSTEM_PROMPT, ALLOWED_CATEGORIES]).encode("utf-8")).hexdigest()[:16]
+
+# Prompt tokens every request pays before any item: system prompt, category list, JSON framing.
+REQUEST_OVERHEAD_TOKENS = len(SYSTEM_PROMPT + json.dumps(ALLOWED_CATEGORIES)) // CHARS_PER_TOKEN + 50
+
 
 def _get_client():
     api_key = os.environ.get("OPENAI_API_KEY")
@@ -78,7 +150,8 @@ def _get_client():
     if OpenAI is None:
         logger.warning("openai package is not installed; AI categorization will be skipped.")
         return None
-    return OpenAI(api_key=api_key)
+    # categorize_batch retries (and adapts to 429s) itself; the client's own retries would hide them.
+    return OpenAI(api_key=api_key, max_retries=0)
 
 
 def _get_model_name() -> str:
@@ -86,14 +159,50 @@ def _get_model_name() -> str:
 
 
 def _get_batch_size() -> int:
-    raw = os.environ.get("AI_BATCH_SIZE", "25")
+    raw = os.environ.get("AI_BATCH_SIZE", "50")
     try:
         size = int(raw)
     except ValueError:
-        size = 25
+        size = 50
     return max(1, min(size, 100))
 
 
+def _get_token_budget() -> int:
+    raw = os.environ.get("AI_BATCH_TOKEN_BUDGET", "12000")
+    try:
+        budget = int(raw)
+    except ValueError:
+        budget = 12000
+    return max(1000, budget)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English/JSON text (~4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_batches(prompt_items: List[Dict[str, Any]], token_budget: int, max_items: int) -> List[List[Dict[str, Any]]]:
+    """
+    Group prompt items into requests of at most `token_budget` estimated prompt tokens
+    (system prompt and category list included) and at most `max_items` items each.
+    Items are packed in order; an item too large for an empty request gets one of its own.
+    """
+    available = token_budget - REQUEST_OVERHEAD_TOKENS
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for it in prompt_items:
+        cost = estimate_tokens(json.dumps(it)) + OUTPUT_TOKENS_PER_ITEM
+        if current and (used + cost > available or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(it)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
 def _get_batch_delay_seconds() -> float:
     raw = os.environ.get("AI_BATCH_DELAY_MS", "250")
     try:
@@ -103,6 +212,15 @@ def _get_batch_delay_seconds() -> float:
     return max(0.0, ms / 1000.0)
 
 
+def _get_max_concurrency() -> int:
+    raw = os.environ.get("AI_MAX_CONCURRENCY", "4")
+    try:
+        n = int(raw)
+    except ValueError:
+        n = 4
+    return max(1, min(n, 32))
+
+
 def categorize_batch(items: List[Dict[str, Any]]) -> Dict[str, str]:
     """
     Categorize a list of template summaries using OpenAI.
@@ -110,10 +228,6 @@ def categorize_batch(items: List[Dict[str, Any]]) -> Dict[str, str]:
     items: [{ "id": str, "title": str, "description": str, "tags": [str], "node_types": [str] }, ...]
     returns: { "<id>": "<CategoryName>", ... }
     """
-    client = _get_client()
-    if client is None:
-        return {}
-
     if not items:
         return {}
 
@@ -121,83 +235,247 @@ def categorize_batch(items: List[Dict[str, Any]]) -> Dict[str, str]:
     max_batch = _get_batch_size()
     delay = _get_batch_delay_seconds()
 
+    prompt_items = [
+        {
+            "id": str(it.get("id") or it.get("source_id") or ""),
+            "title": it.get("title") or "",
+            "description": (it.get("description") or "")[:4000],
+            "tags": it.get("tags") or [],
+            "node_types": it.get("node_types") or [],
+        }
+        for it in items
+    ]
+    # Skip items missing an id
+    prompt_items = [it for it in prompt_items if it["id"]]
+
     results: Dict[str, str] = {}
+    keys: Dict[str, str] = {}
+    cache = get_category_cache()
+    if cache is not None:
+        keys = {it["id"]: item_key(model, PROMPT_VERSION, it) for it in prompt_items}
+        cached = cache.get_many(keys.values())
+        for _id, key in keys.items():
+            cat = cached.get(key)
+            if cat in ALLOWED_CATEGORIES:
+                results[_id] = cat
+        prompt_items = [it for it in prompt_items if it["id"] not in results]
 
-    for start in range(0, len(items), max_batch):
-        batch = items[start : start + max_batch]
-
-        payload = {
-            "allowed_categories": ALLOWED_CATEGORIES,
-            "items": [
-                {
-                    "id": str(it.get("id") or it.get("source_id")),
-                    "title": it.get("title") or "",
-                    "description": (it.get("description") or "")[:4000],
-                    "tags": it.get("tags") or [],
-                    "node_types": it.get("node_types") or [],
-                }
-                for it in batch
-            ],
-        }
+    if not prompt_items:
+        return results
+
+    client = _get_client()
+    if client is None:
+        return results
 
-        # Skip if any item is missing id
-        payload["items"] = [it for it in payload["items"] if it["id"]]
-        if not payload["items"]:
+    batches = pack_batches(prompt_items, _get_token_budget(), max_batch)
+    max_concurrency = _get_max_concurrency()
+    limiter = AdaptiveConcurrency(initial=min(2, max_concurrency), maximum=max_concurrency)
+
+    # Every sub-batch is submitted up front; the limiter decides how many are actually in flight.
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+        futures = [pool.submit(_categorize_sub_batch, client, model, batch, limiter, delay) for batch in batches]
+        for future in futures:
+            fresh = future.result()
+            results.update(fresh)
+            if cache is not None:
+                cache.put_many((keys[_id], cat) for _id, cat in fresh.items())
+
+    if limiter.throttled:
+        logger.info("OpenAI rate-limited %s request(s); final concurrency %.1f", limiter.throttled, limiter.limit)
+    return results
+
+
+def _categorize_sub_batch(
+    client: Any, model: str, batch: List[Dict[str, Any]], limiter: AdaptiveConcurrency, delay: float
+) -> Dict[str, str]:
+    """
+    Send one sub-batch, retrying only this sub-batch on errors. Ids the model leaves out
+    (or answers with an unknown category) are re-asked on their own, up to MAX_REASKS times.
+    Returns { id: category }.
+    """
+    fresh: Dict[str, str] = {}
+    pending = batch
+    for round_ in range(MAX_REASKS + 1):
+        content = _request_categories(client, model, pending, limiter, delay)
+        if content is None:
+            break
+        pending_ids = {it["id"] for it in pending}
+        for _id, cat in parse_categories(content).items():
+            if _id in pending_ids and cat in ALLOWED_CATEGORIES:
+                fresh[_id] = cat
+        pending = [it for it in pending if it["id"] not in fresh]
+        if not pending:
+            break
+        if round_ < MAX_REASKS:
+            logger.info("AI response missing %s of %s ids; re-asking for those only", len(pending), len(pending_ids))
+    if pending:
+        logger.warning(
+            "AI response missing %s of %s ids: %s", len(pending), len(batch), sorted(it["id"] for it in pending)[:10]
+        )
+    return fresh
+
+
+def _request_categories(
+    client: Any, model: str, items: List[Dict[str, Any]], limiter: AdaptiveConcurrency, delay: float
+) -> Optional[str]:
+    """One chat completion for `items` with error / rate-limit retries; None when every attempt failed."""
+    payload = {
+        "allowed_categories": ALLOWED_CATEGORIES,
+        "items": items,
+    }
+
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": json.dumps(payload),
+        },
+    ]
+
+    backoff = 1.0
+    max_retries = 3
+    attempt = 0
+    throttles = 0
+
+    while True:
+        try:
+            with limiter.slot():
+                try:
+                    content, headers = _create_completion(client, model, messages)
+                finally:
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as exc:  # noqa: BLE001
+            if _is_rate_limited(exc) and throttles < MAX_THROTTLE_RETRIES:
+                throttles += 1
+                retry_after = _retry_after_seconds(getattr(getattr(exc, "response", None), "headers", None))
+                limiter.record_throttle(retry_after if retry_after is not None else backoff)
+                logger.info("OpenAI rate limit hit; retrying sub-batch (throttle %s/%s)", throttles, MAX_THROTTLE_RETRIES)
+                continue
+            attempt += 1
+            logger.warning("Error from OpenAI (attempt %s/%s): %s", attempt, max_retries, exc)
+            if attempt >= max_retries:
+                return None
+            time.sleep(backoff)
+            backoff *= 2
             continue
 
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are an expert product categorizer for workflow automations. "
-                    "For each item, choose exactly ONE category from the allowed list that best "
-                    "describes the primary purpose of the workflow. "
-                    "Respond as a JSON array of objects, each with fields 'id' and 'category'. "
-                    "The 'category' MUST be one of the allowed_categories exactly, and you must "
-                    "return the same number of items, in the same order, as the input."
-                ),
-            },
-            {
-                "role": "user",
-                "content": json.dumps(payload),
-            },
-        ]
+        if _nearly_exhausted(headers):
+            limiter.record_throttle()
+        else:
+            limiter.record_success()
+        return content
 
-        backoff = 1.0
-        max_retries = 3
 
-        for attempt in range(max_retries):
+def parse_categories(content: str) -> Dict[str, str]:
+    """
+    Leniently read {id: category} from a model response. Accepts the schema shape
+    {"results": [...]}, a bare array, an {id: category} object, JSON wrapped in prose or
+    code fences, and truncated output (every complete {"id", "category"} object is kept).
+    """
+    data: Any = None
+    try:
+        data = loads(content)
+    except ValueError:
+        start, end = content.find("["), content.rfind("]")
+        if 0 <= start < end:
             try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.0,
-                )
-                content = response.choices[0].message.content or "[]"
-                data = json.loads(content)
-                if not isinstance(data, list):
-                    logger.warning("AI response is not a list; skipping batch.")
-                    break
-                for entry in data:
-                    if not isinstance(entry, dict):
-                        continue
-                    _id = str(entry.get("id") or "")
-                    cat = str(entry.get("category") or "")
-                    if not _id or not cat:
-                        continue
-                    if cat not in ALLOWED_CATEGORIES:
-                        continue
-                    results[_id] = cat
-                break
-            except Exception as exc:  # noqa: BLE001
-                logger.warning("Error from OpenAI (attempt %s/%s): %s", attempt + 1, max_retries, exc)
-                if attempt == max_retries - 1:
-                    break
-                time.sleep(backoff)
-                backoff *= 2
-
-        if delay > 0:
-            time.sleep(delay)
+                data = loads(content[start : end + 1])
+            except ValueError:
+                data = None
+    if isinstance(data, dict):
+        lists = [v for v in data.values() if isinstance(v, list)]
+        if lists:
+            data = lists[0]
+        else:
+            return {str(k): v for k, v in data.items() if isinstance(v, str)}
 
+    entries = data if isinstance(data, list) else []
+    if not entries:
+        # Fall back to every flat JSON object in the text.
+        for m in _OBJECT_RE.finditer(content):
+            try:
+                entries.append(loads(m.group(0)))
+            except ValueError:
+                continue
+
+    results: Dict[str, str] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        _id = str(entry.get("id") or "")
+        cat = str(entry.get("category") or "")
+        if _id and cat:
+            results[_id] = cat
     return results
 
+
+def _rejects_structured_output(exc: Exception) -> bool:
+    """A 400 about response_format / json_schema, as opposed to any other bad request."""
+    if getattr(exc, "status_code", None) != 400:
+        return False
+    message = str(exc).lower()
+    return "response_format" in message or "json_schema" in message
+
+
+def _create_completion(client: Any, model: str, messages: List[Dict[str, str]]) -> Tuple[str, Any]:
+    """
+    Call chat.completions.create with the RESPONSE_FORMAT schema; returns (content, response
+    headers or None). If the model or endpoint rejects response_format, the rest of the run
+    goes without it (the prompt still asks for the same JSON shape). Other 400s are raised.
+    """
+    global _structured_output_available
+    completions = client.chat.completions
+    raw_api = getattr(completions, "with_raw_response", None)
+    create = raw_api.create if raw_api is not None else completions.create
+    kwargs: Dict[str, Any] = {"model": model, "messages": messages, "temperature": 0.0}
+    if _structured_output_available:
+        try:
+            result = create(response_format=RESPONSE_FORMAT, **kwargs)
+        except Exception as exc:  # noqa: BLE001
+            if not _rejects_structured_output(exc):
+                raise
+            logger.warning("Structured output rejected (%s); continuing without response_format", exc)
+            _structured_output_available = False
+            result = create(**kwargs)
+    else:
+        result = create(**kwargs)
+    if raw_api is not None:
+        response, headers = result.parse(), result.headers
+    else:
+        response, headers = result, None
+    return response.choices[0].message.content or "", headers
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def _retry_after_seconds(headers: Any) -> Optional[float]:
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        raw = headers.get(name)
+        if raw is None:
+            continue
+        try:
+            return float(raw) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _nearly_exhausted(headers: Any) -> bool:
+    """True when x-ratelimit-remaining-requests says the window is almost used up."""
+    if not headers:
+        return False
+    raw = headers.get("x-ratelimit-remaining-requests")
+    if raw is None:
+        return False
+    try:
+        return int(raw) <= 1
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,254 @@
+"""
+Benchmarks for the scraper's hot paths on the local template corpus.
+
+Usage:
+  python bench.py json [--templates-dir PATH] [--limit N] [--repeat N]
+  python bench.py category [--templates-dir PATH] [--limit N] [--repeat N]
+  python bench.py ai [--templates-dir PATH] [--limit N] [--latency-ms MS] [--rate-limit P] [--malformed P]
+
+json: reads every template file into memory once, then times decoding with each installed
+JSON backend (see json_codec.py), plus decode + normalize_from_local_json end to end.
+
+category: times derive_category_from_tags_and_text (compiled CategoryMatcher) against the
+previous split-and-lookup loop on every template's tags, title and sticky-note text, and
+counts templates whose category changed.
+
+ai: runs ai_categorizer.categorize_batch over the corpus against an in-process mock
+OpenAI server (mock_openai.py) and reports items/s, requests, injected 429s / malformed
+responses, and p50/p99 request latency. Needs the openai package; no key or network.
+Tune with the usual AI_BATCH_SIZE / AI_BATCH_TOKEN_BUDGET / AI_MAX_CONCURRENCY env vars.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, List
+
+import ai_categorizer
+from category_cache import configure_category_cache
+from corpus_snapshot import TEMPLATES_DIR, iter_jsons
+from json_codec import BACKEND, available_backends, loads
+from mock_openai import MockConfig, MockOpenAI
+from normalize import (
+    CATEGORY_BY_TAG,
+    CATEGORY_PRIORITY,
+    _normalize_token,
+    derive_category_from_tags_and_text,
+    normalize_from_local_json,
+)
+
+
+def _read_corpus(templates_dir: Path, limit: int) -> List[bytes]:
+    paths = list(iter_jsons(templates_dir))
+    if limit:
+        paths = paths[:limit]
+    return [p.read_bytes() for p in paths]
+
+
+def _best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_json(args: argparse.Namespace) -> None:
+    blobs = _read_corpus(args.templates_dir, args.limit)
+    if not blobs:
+        return
+    total_mb = sum(len(b) for b in blobs) / 1e6
+    print(f"Corpus: {len(blobs)} files, {total_mb:.1f} MB (default backend: {BACKEND})")
+    print(f"{'backend':<10} {'decode s':>9} {'MB/s':>8} {'+normalize s':>13} {'speedup':>8}")
+
+    baseline = None
+    for name, decode in reversed(list(available_backends().items())):
+        decode_s = _best_of(args.repeat, lambda: [decode(b) for b in blobs])
+
+        def decode_and_normalize() -> None:
+            for i, b in enumerate(blobs):
+                normalize_from_local_json(decode(b), source_id=str(i))
+
+        full_s = _best_of(args.repeat, decode_and_normalize)
+        if baseline is None:
+            baseline = decode_s
+        print(f"{name:<10} {decode_s:>9.3f} {total_mb / decode_s:>8.1f} {full_s:>13.3f} {baseline / decode_s:>7.2f}x")
+
+
+def _token_loop_category(tags: List[Any], title: str, description: str) -> str:
+    """The pre-CategoryMatcher implementation: split text into tokens, one dict lookup each."""
+    best_category = ""
+    best_priority = -1
+    names = [t.get("name") or "" if isinstance(t, dict) else t for t in tags or []]
+    tokens = re.split(r"[^a-z0-9+]+", f"{title or ''} {description or ''}".lower())
+    for tok in names + tokens:
+        cat = CATEGORY_BY_TAG.get(_normalize_token(tok))
+        if not cat:
+            continue
+        prio = CATEGORY_PRIORITY.get(cat, 50)
+        if prio > best_priority:
+            best_category = cat
+            best_priority = prio
+    return best_category
+
+
+def bench_category(args: argparse.Namespace) -> None:
+    samples = []
+    for blob in _read_corpus(args.templates_dir, args.limit):
+        try:
+            data = loads(blob)
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        norm = normalize_from_local_json(data, source_id="")
+        notes = " ".join(
+            str((n.get("parameters") or {}).get("content") or "")
+            for n in norm["nodes"]
+            if isinstance(n, dict) and n.get("type") == "n8n-nodes-base.stickyNote"
+        )
+        samples.append((norm["tags"], norm["title"], notes))
+    if not samples:
+        return
+    total_mb = sum(len(t) + len(d) for _, t, d in samples) / 1e6
+    print(f"Corpus: {len(samples)} templates, {total_mb:.1f} MB of title + sticky-note text")
+
+    old_s = _best_of(args.repeat, lambda: [_token_loop_category(*s) for s in samples])
+    new_s = _best_of(args.repeat, lambda: [derive_category_from_tags_and_text(*s) for s in samples])
+    changed = sum(_token_loop_category(*s) != derive_category_from_tags_and_text(*s) for s in samples)
+    print(f"{'token loop':<12} {old_s:>8.3f} s")
+    print(f"{'matcher':<12} {new_s:>8.3f} s  ({old_s / new_s:.2f}x)")
+    print(f"Category changed for {changed} templates (phrase matches)")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_ai(args: argparse.Namespace) -> None:
+    if ai_categorizer.OpenAI is None:
+        print("openai package is not installed; pip install openai to run this benchmark.")
+        return
+    items = []
+    for i, blob in enumerate(_read_corpus(args.templates_dir, args.limit)):
+        try:
+            data = loads(blob)
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        norm = normalize_from_local_json(data, source_id=str(i))
+        items.append(
+            {
+                "id": str(i),
+                "title": norm["title"],
+                "description": norm["description"],
+                "tags": norm["tags"],
+                "node_types": [nt for nt, _ in norm["node_type_counts"]],
+            }
+        )
+    if not items:
+        return
+
+    # Time every HTTP round trip, including the ones that end in a 429 or an error, and count
+    # packed sub-batches and request_categories calls so retries can be told apart.
+    latencies: List[float] = []
+    calls = {"sub_batches": 0, "resends": 0}
+    create_completion = ai_categorizer._create_completion
+    categorize_sub_batch = ai_categorizer._categorize_sub_batch
+    request_categories = ai_categorizer._request_categories
+
+    def timed_create_completion(*a: Any, **kw: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return create_completion(*a, **kw)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    def counted_sub_batch(*a: Any, **kw: Any) -> Any:
+        calls["sub_batches"] += 1
+        return categorize_sub_batch(*a, **kw)
+
+    def counted_request(*a: Any, **kw: Any) -> Any:
+        calls["resends"] += 1
+        return request_categories(*a, **kw)
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+        retry_after_ms=args.retry_after_ms,
+        malformed=args.malformed,
+        seed=args.seed,
+    )
+    configure_category_cache(enabled=False)
+    ai_categorizer._create_completion = timed_create_completion
+    ai_categorizer._categorize_sub_batch = counted_sub_batch
+    ai_categorizer._request_categories = counted_request
+    try:
+        with MockOpenAI(config) as mock:
+            os.environ["OPENAI_API_KEY"] = "mock"
+            os.environ["OPENAI_BASE_URL"] = mock.base_url
+            started = time.perf_counter()
+            results = ai_categorizer.categorize_batch(items)
+            elapsed = time.perf_counter() - started
+            stats = mock.stats.as_dict()
+    finally:
+        ai_categorizer._create_completion = create_completion
+        ai_categorizer._categorize_sub_batch = categorize_sub_batch
+        ai_categorizer._request_categories = request_categories
+
+    print(f"Items: {len(items)}, categorized: {len(results)}, elapsed {elapsed:.2f} s, {len(items) / elapsed:.1f} items/s")
+    print(
+        f"Requests: {stats['requests']} (429: {stats['rate_limited']}, malformed: {stats['malformed']}), "
+        f"latency p50 {_percentile(latencies, 50) * 1000:.0f} ms, p99 {_percentile(latencies, 99) * 1000:.0f} ms"
+    )
+    # Every request beyond one per packed sub-batch is a retry: a 429 / error retry inside
+    # request_categories, or a re-send of ids missing from a response.
+    resends = calls["resends"] - calls["sub_batches"]
+    print(
+        f"Sub-batches: {calls['sub_batches']}, retries: {len(latencies) - calls['sub_batches']} "
+        f"(429/error: {len(latencies) - calls['resends']}, missing-id re-sends: {resends})"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("json", help="Compare JSON decoding backends on the local corpus")
+    p.add_argument("--templates-dir", type=Path, default=TEMPLATES_DIR)
+    p.add_argument("--limit", type=int, default=0, help="Max files (0 = all)")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per backend; the best is reported")
+    p.set_defaults(func=bench_json)
+
+    p = sub.add_parser("category", help="Compare category derivation implementations on the local corpus")
+    p.add_argument("--templates-dir", type=Path, default=TEMPLATES_DIR)
+    p.add_argument("--limit", type=int, default=0, help="Max files (0 = all)")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per implementation; the best is reported")
+    p.set_defaults(func=bench_category)
+
+    p = sub.add_parser("ai", help="Drive categorize_batch against a local mock OpenAI server")
+    p.add_argument("--templates-dir", type=Path, default=TEMPLATES_DIR)
+    p.add_argument("--limit", type=int, default=2000, help="Max files (0 = all)")
+    p.add_argument("--latency-ms", type=float, default=300.0, help="Mean mock response latency")
+    p.add_argument("--jitter-ms", type=float, default=150.0)
+    p.add_argument("--rate-limit", type=float, default=0.05, help="Probability of a 429 per request")
+    p.add_argument("--retry-after-ms", type=int, default=500)
+    p.add_argument("--malformed", type=float, default=0.05, help="Probability of a malformed / partial response")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_ai)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Persistent memo cache for AI categorization results.
+
+ai_categorizer.categorize_batch looks every item up here before building OpenAI
+sub-batches, so re-runs only pay for templates whose prompt inputs changed. Entries
+live in a single SQLite file keyed by a SHA-256 of the model name, a version of the
+prompt + ALLOWED_CATEGORIES, and the exact per-item payload sent to the model
+(title, trimmed description, tags, node_types). Changing any of these misses the
+cache; nothing expires otherwise.
+
+Configuration (env, or configure_category_cache() from a CLI flag):
+  AI_CATEGORY_CACHE   path to the SQLite file (default scripts/scraper/.ai_category_cache.sqlite);
+                      "off" disables the cache
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".ai_category_cache.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    key TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def item_key(model: str, version: str, item: dict) -> str:
+    """Key for one prompt item; `item` is the dict sent to the model (including its id)."""
+    raw = json.dumps([model, version, item], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CategoryCache:
+    """Thread-safe SQLite map of prompt-item key -> category."""
+
+    def __init__(self, path: Path | str = DEFAULT_CACHE_PATH) -> None:
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return {key: category} for the keys present; counts hits and misses."""
+        wanted = list(dict.fromkeys(keys))
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(wanted), 500):
+                chunk = wanted[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, category FROM categories WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, str]]) -> None:
+        now = time.time()
+        rows = [(key, category, now) for key, category in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO categories (key, category, created_at) VALUES (?, ?, ?)", rows
+            )
+            self.stored += len(rows)
+
+    def stats_summary(self) -> str:
+        return f"ai category cache: hits={self.hits} misses={self.misses} stored={self.stored}"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[CategoryCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def configure_category_cache(path: Path | str | None = None, enabled: bool = True) -> Optional[CategoryCache]:
+    """
+    Set the process-wide cache explicitly (e.g. from a --no-ai-cache flag).
+    path None falls back to AI_CATEGORY_CACHE, then to DEFAULT_CACHE_PATH.
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = _build_cache(path) if enabled else None
+        _cache_configured = True
+    return _cache
+
+
+def get_category_cache() -> Optional[CategoryCache]:
+    """Return the process-wide cache, or None when it is disabled."""
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                _cache = _build_cache(None)
+                _cache_configured = True
+    return _cache
+
+
+def _build_cache(path: Path | str | None) -> Optional[CategoryCache]:
+    resolved = path or os.environ.get("AI_CATEGORY_CACHE") or DEFAULT_CACHE_PATH
+    if str(resolved).strip().lower() == "off":
+        return None
+    return CategoryCache(resolved)
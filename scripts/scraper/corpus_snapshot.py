@@ -0,0 +1,356 @@
+"""
+Compact snapshot of the local template corpus (n8n-workflow-all-templates/**/*.json).
+
+build_snapshot() walks the corpus once and stores, per template, the fields produced by
+normalize_from_local_json (source_id, title, description, category, tags, node_type_counts,
+source_url, content_hash) as columns of a SQLite table, plus an (offset, length) into a single
+blob file holding the original JSON bytes. CorpusSnapshot opens both read-only (the blob is
+memory-mapped), so tools that only need metadata start without touching 150+ MB of JSON, and
+raw workflows are decoded lazily per template.
+
+Rebuilds are incremental: files whose path, size and mtime match the previous snapshot are
+copied over without being parsed again.
+
+Layout (default scripts/scraper/.corpus/):
+  corpus.sqlite      templates table + meta table
+  raw-<build>.bin    concatenated template JSON; the build id is recorded in meta
+
+Usage:
+  python corpus_snapshot.py build [--templates-dir PATH] [--out DIR] [--workers N] [--full]
+  python corpus_snapshot.py info [--out DIR]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from json_codec import load_path, loads
+from normalize import normalize_from_local_json
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+TEMPLATES_DIR = REPO_ROOT / "n8n-workflow-all-templates"
+SNAPSHOT_DIR = Path(__file__).resolve().parent / ".corpus"
+DB_NAME = "corpus.sqlite"
+SNAPSHOT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE templates (
+    ordinal INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    node_type_counts TEXT NOT NULL,
+    source_url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    raw_offset INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+ROW_COLUMNS = (
+    "ordinal", "path", "source_id", "title", "description", "category",
+    "tags", "node_type_counts", "source_url", "content_hash",
+)
+
+
+def iter_jsons(templates_dir: Path = TEMPLATES_DIR):
+    if not templates_dir.exists():
+        print("Templates dir not found:", templates_dir)
+        return
+    for path in templates_dir.rglob("*.json"):
+        yield path
+
+
+def normalize_local_data(data: dict, path: Path) -> dict | None:
+    """Normalize one decoded local template; None when it has no nodes."""
+    if not data.get("nodes"):
+        return None
+    source_id = data.get("meta", {}).get("id") or path.stem
+    if isinstance(source_id, int):
+        source_id = str(source_id)
+    source_url = data.get("meta", {}).get("site", "")
+    return normalize_from_local_json(data, source_id=source_id, source_url=source_url)
+
+
+def load_and_normalize(path: Path) -> tuple[Path, dict | None, str | None]:
+    """
+    Parse and normalize one local template file.
+    Returns (path, normalized, error); normalized is None when the file is skipped or fails.
+    Top-level so it can run in a worker process.
+    """
+    try:
+        return path, normalize_local_data(load_path(path), path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def _normalize_file(path: Path) -> tuple[Path, dict | None, bytes | None, str | None]:
+    """Read and normalize one template; returns (path, normalized, raw bytes, error)."""
+    try:
+        raw = path.read_bytes()
+        norm = normalize_local_data(loads(raw), path)
+    except Exception as e:  # noqa: BLE001
+        return path, None, None, str(e)
+    if norm is None:
+        return path, None, None, None
+    # Only the columns are sent back to the parent; the raw JSON travels as bytes.
+    slim = {k: norm[k] for k in ("source_id", "title", "description", "category", "tags",
+                                 "node_type_counts", "source_url", "content_hash")}
+    return path, slim, raw, None
+
+
+def build_snapshot(templates_dir: Path, out_dir: Path = SNAPSHOT_DIR, workers: int = 1, full: bool = False) -> Dict[str, int]:
+    """
+    (Re)build the snapshot for `templates_dir` into `out_dir`. Unchanged files are reused
+    from the existing snapshot unless `full`. Returns counts: total, reused, parsed, errors.
+    """
+    templates_dir = Path(templates_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = sorted(iter_jsons(templates_dir))
+
+    previous: Optional[CorpusSnapshot] = None
+    reusable: Dict[str, Dict[str, Any]] = {}
+    if not full:
+        previous = CorpusSnapshot.open(out_dir)
+        if previous is not None and previous.meta.get("templates_dir") == str(templates_dir):
+            for row in previous.conn.execute("SELECT * FROM templates"):
+                reusable[row["path"]] = dict(row)
+
+    build_id = uuid.uuid4().hex[:12]
+    blob_path = out_dir / f"raw-{build_id}.bin"
+    tmp_db = out_dir / f"{DB_NAME}.{build_id}.tmp"
+    conn = sqlite3.connect(str(tmp_db))
+    conn.executescript(_SCHEMA)
+
+    stats = {"total": 0, "reused": 0, "parsed": 0, "errors": 0}
+    to_parse: List[Path] = []
+    stat_by_path: Dict[str, os.stat_result] = {}
+    for path in paths:
+        rel = str(path.relative_to(templates_dir))
+        st = path.stat()
+        stat_by_path[rel] = st
+        old = reusable.get(rel)
+        if old is None or old["mtime_ns"] != st.st_mtime_ns or old["size"] != st.st_size:
+            to_parse.append(path)
+
+    reparsed = {str(p.relative_to(templates_dir)) for p in to_parse}
+    parsed: Dict[str, tuple[dict, bytes]] = {}
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(to_parse) > 1 else None
+    try:
+        results = (
+            executor.map(_normalize_file, to_parse, chunksize=max(1, min(64, len(to_parse) // (workers * 4) or 1)))
+            if executor is not None
+            else map(_normalize_file, to_parse)
+        )
+        for path, norm, raw, error in results:
+            if norm is None:
+                if error:
+                    stats["errors"] += 1
+                continue
+            parsed[str(path.relative_to(templates_dir))] = (norm, raw)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    rows = []
+    offset = 0
+    with open(blob_path, "wb") as blob:
+        for path in paths:
+            rel = str(path.relative_to(templates_dir))
+            st = stat_by_path[rel]
+            if rel in parsed:
+                norm, raw = parsed[rel]
+                stats["parsed"] += 1
+            elif rel in reusable and rel not in reparsed:
+                old = reusable[rel]
+                norm = {k: old[k] for k in ("source_id", "title", "description", "category", "source_url", "content_hash")}
+                norm["tags"] = loads(old["tags"])
+                norm["node_type_counts"] = loads(old["node_type_counts"])
+                raw = previous.raw_bytes(old)  # type: ignore[union-attr]
+                stats["reused"] += 1
+            else:
+                continue
+            blob.write(raw)
+            rows.append((
+                len(rows), rel, st.st_mtime_ns, st.st_size,
+                str(norm["source_id"]), norm["title"], norm["description"] or "", norm["category"] or "",
+                json.dumps(norm["tags"]), json.dumps([list(p) for p in norm["node_type_counts"]]),
+                norm["source_url"] or "", norm["content_hash"], offset, len(raw),
+            ))
+            offset += len(raw)
+    stats["total"] = len(rows)
+
+    conn.executemany(f"INSERT INTO templates VALUES ({','.join('?' * 14)})", rows)
+    conn.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?)",
+        [
+            ("version", str(SNAPSHOT_VERSION)),
+            ("templates_dir", str(templates_dir)),
+            ("blob", blob_path.name),
+            ("built_at", str(time.time())),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    old_blob = previous.blob_path if previous is not None else None
+    if previous is not None:
+        previous.close()
+    os.replace(tmp_db, out_dir / DB_NAME)
+    if old_blob is not None and old_blob != blob_path and old_blob.exists():
+        old_blob.unlink()
+    return stats
+
+
+class CorpusSnapshot:
+    """Read-only view of a built snapshot. Use CorpusSnapshot.open(); rows are plain dicts."""
+
+    def __init__(self, out_dir: Path, conn: sqlite3.Connection, meta: Dict[str, str]) -> None:
+        self.out_dir = out_dir
+        self.conn = conn
+        self.meta = meta
+        self.blob_path = out_dir / meta["blob"]
+        self._blob_file = open(self.blob_path, "rb")
+        size = self.blob_path.stat().st_size
+        self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @classmethod
+    def open(cls, out_dir: Path = SNAPSHOT_DIR) -> Optional["CorpusSnapshot"]:
+        """Open the snapshot in `out_dir`; None when there is none (or it is from another version)."""
+        db = Path(out_dir) / DB_NAME
+        if not db.is_file():
+            return None
+        conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA mmap_size = 268435456")
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta.get("version") != str(SNAPSHOT_VERSION) or not (Path(out_dir) / meta.get("blob", "")).is_file():
+            conn.close()
+            return None
+        return cls(Path(out_dir), conn, meta)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+
+    def __enter__(self) -> "CorpusSnapshot":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Metadata rows in ordinal order; tags and node_type_counts are decoded lists."""
+        for row in self.conn.execute(f"SELECT {', '.join(ROW_COLUMNS)} FROM templates ORDER BY ordinal"):
+            item = dict(row)
+            item["tags"] = loads(item["tags"])
+            item["node_type_counts"] = [tuple(p) for p in loads(item["node_type_counts"])]
+            yield item
+
+    def raw_bytes(self, row: Dict[str, Any]) -> bytes:
+        if "raw_offset" not in row:
+            row = dict(self.conn.execute(
+                "SELECT raw_offset, raw_length FROM templates WHERE ordinal = ?", (row["ordinal"],)
+            ).fetchone())
+        return bytes(self._blob[row["raw_offset"] : row["raw_offset"] + row["raw_length"]])
+
+    def raw_workflow(self, row: Dict[str, Any]) -> dict:
+        return loads(self.raw_bytes(row))
+
+    def normalized(self, row: Dict[str, Any]) -> dict:
+        """Full normalize_from_local_json-shaped dict for a row (decodes its raw workflow)."""
+        raw = self.raw_workflow(row)
+        return {
+            "source_id": row["source_id"],
+            "title": row["title"],
+            "description": row["description"],
+            "category": row["category"],
+            "tags": list(row["tags"]),
+            "nodes": raw.get("nodes") or [],
+            "raw_workflow": raw,
+            "source_url": row["source_url"],
+            "node_type_counts": list(row["node_type_counts"]),
+            "content_hash": row["content_hash"],
+        }
+
+    def close(self) -> None:
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob_file.close()
+        self.conn.close()
+
+
+def load_rows(templates_dir: Optional[Path] = None, snapshot_dir: Path = SNAPSHOT_DIR) -> List[Dict[str, Any]]:
+    """
+    Corpus metadata rows for analysis tools: from the snapshot when one exists (and matches
+    templates_dir if given), otherwise by normalizing the files directly (raw bytes not kept).
+    """
+    snap = CorpusSnapshot.open(snapshot_dir)
+    if snap is not None and (templates_dir is None or snap.meta.get("templates_dir") == str(Path(templates_dir).resolve())):
+        with snap:
+            return list(snap.rows())
+    if snap is not None:
+        snap.close()
+    root = Path(templates_dir or TEMPLATES_DIR).resolve()
+    rows = []
+    for path in sorted(iter_jsons(root)):
+        _, norm, _ = load_and_normalize(path)
+        if norm is None:
+            continue
+        row = {k: norm[k] for k in ROW_COLUMNS if k in norm}
+        row["ordinal"] = len(rows)
+        row["path"] = str(path.relative_to(root))
+        rows.append(row)
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build or inspect the local corpus snapshot.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="Build (incrementally) from the local template JSON files")
+    p.add_argument("--templates-dir", type=Path, default=TEMPLATES_DIR)
+    p.add_argument("--out", type=Path, default=SNAPSHOT_DIR)
+    p.add_argument("--workers", type=int, default=0, help="Processes for parsing (0 = CPU count, 1 = serial)")
+    p.add_argument("--full", action="store_true", help="Re-parse every file instead of reusing unchanged ones")
+    p = sub.add_parser("info", help="Show snapshot size and load time")
+    p.add_argument("--out", type=Path, default=SNAPSHOT_DIR)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        stats = build_snapshot(args.templates_dir, args.out, workers=workers, full=args.full)
+        print(
+            f"Snapshot: {stats['total']} templates (reused={stats['reused']}, parsed={stats['parsed']}, "
+            f"errors={stats['errors']}) in {time.perf_counter() - started:.2f} s -> {args.out}"
+        )
+        return
+
+    started = time.perf_counter()
+    snap = CorpusSnapshot.open(args.out)
+    if snap is None:
+        print(f"No snapshot in {args.out}; run: python corpus_snapshot.py build")
+        return
+    with snap:
+        rows = list(snap.rows())
+        elapsed = time.perf_counter() - started
+        blob_mb = snap.blob_path.stat().st_size / 1e6
+        print(f"{len(rows)} templates from {snap.meta['templates_dir']}")
+        print(f"raw blob {blob_mb:.1f} MB; metadata loaded in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Near-duplicate template detection over workflow structure (MinHash + LSH).
+
+Each workflow is reduced to a set of shingles that ignore everything a renamed copy changes
+(template and node names, positions, ids, credentials, sticky notes):
+  - node types, as a multiset ("n:<type>:<k>" for the k-th node of a type)
+  - connection shape, as a multiset of typed edges ("e:<src type>/<output>><dst type>:<k>")
+  - normalized parameters ("p:<type>:<path>=<value>"): in values up to LONG_TEXT characters,
+    numbers, long ids, URLs and node-name references inside expressions become placeholders
+    (longer values, i.e. code and prompts, are kept verbatim)
+
+A one-permutation MinHash signature estimates the Jaccard similarity of two shingle sets:
+each shingle gets one 64-bit BLAKE2b hash whose low bits pick one of NUM_PERM bins and whose
+high bits compete for that bin's minimum; empty bins are filled from the next non-empty bin
+(rotation densification). That is one hash per shingle instead of NUM_PERM, which keeps
+signing the whole corpus to a few seconds in pure Python. LSH splits signatures into
+LSH_BANDS bands of LSH_ROWS values; only templates that share a band are compared, so the
+cost grows with the number of near-duplicates rather than with n^2. Pairs at or above the
+threshold are joined with union-find (single linkage), and every cluster is named after its
+lowest source_id, its representative.
+
+Cluster ids are written to templates.cluster_id (migration 20250223000001): NULL for unique
+templates, the representative's source_id for every member of a cluster (including the
+representative itself). enrich_metadata sends one template per cluster to OpenAI and copies
+the category to the others; search_index.py search --collapse shows one hit per cluster.
+
+Usage:
+  python dedup.py local [--templates-dir PATH] [--snapshot DIR] [--out FILE] [--threshold 0.85]
+  python dedup.py supabase [--threshold 0.85] [--page-size 200] [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from operator import eq
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLUSTERS_PATH = Path(__file__).resolve().parent / ".corpus" / "clusters.json"
+DEFAULT_THRESHOLD = 0.85
+NUM_PERM = 128  # power of two: the bin is the hash's low bits
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+_BIN_BITS = NUM_PERM.bit_length() - 1
+_EMPTY = 1 << 64
+# Added per bin of distance when densifying, so borrowed values differ from the originals.
+_DENSIFY_STEP = 1 << 57
+UPDATE_CHUNK = 200
+LONG_TEXT = 256
+
+Signature = Tuple[int, ...]
+
+IGNORED_NODE_TYPES = {"n8n-nodes-base.stickyNote"}
+# Resource-locator caches and ids differ between copies of the same workflow.
+IGNORED_PARAM_KEYS = {"cachedResultName", "cachedResultUrl", "webhookId", "credentials"}
+
+_NODE_REF_RE = re.compile(r"""\$node\[\s*(["']).*?\1\s*\]|\$\(\s*(["']).*?\2\s*\)""")
+_URL_RE = re.compile(r"https?://[^\s\"']+")
+_ID_RE = re.compile(r"^(?=.*\d)[A-Za-z0-9_-]{16,}$")
+_DIGITS = str.maketrans("0123456789", "##########")
+
+
+def _normalize_value(value: Any) -> str:
+    if isinstance(value, bool) or value is None:
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return "#"
+    text = str(value).strip()
+    if len(text) > LONG_TEXT:
+        # Code and prompts: copies share them verbatim, and normalizing them costs the most.
+        return text
+    if _ID_RE.match(text):
+        return "<id>"
+    if "$" in text:
+        text = _NODE_REF_RE.sub("$node[]", text)
+    if "://" in text:
+        text = _URL_RE.sub("<url>", text)
+    return " ".join(text.lower().translate(_DIGITS).split())
+
+
+def _flatten_params(value: Any, path: str, out: List[str], prefix: str) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in IGNORED_PARAM_KEYS:
+                _flatten_params(item, f"{path}.{key}" if path else key, out, prefix)
+    elif isinstance(value, list):
+        for item in value:
+            _flatten_params(item, f"{path}[]", out, prefix)
+    else:
+        out.append(f"{prefix}{path}={_normalize_value(value)}")
+
+
+def workflow_shingles(workflow: Dict[str, Any]) -> List[str]:
+    """Structural shingles of one raw workflow (nodes + connections); empty when it has no nodes."""
+    nodes = [n for n in workflow.get("nodes") or [] if isinstance(n, dict) and n.get("type") not in IGNORED_NODE_TYPES]
+    type_by_name = {n.get("name"): n.get("type") or "" for n in nodes}
+    shingles: List[str] = []
+
+    seen: Counter = Counter()
+    for node in nodes:
+        node_type = node.get("type") or ""
+        seen[node_type] += 1
+        shingles.append(f"n:{node_type}:{seen[node_type]}")
+        _flatten_params(node.get("parameters") or {}, "", shingles, f"p:{node_type}:")
+
+    edges: Counter = Counter()
+    for src, outputs in (workflow.get("connections") or {}).items():
+        src_type = type_by_name.get(src)
+        if src_type is None or not isinstance(outputs, dict):
+            continue
+        for conn_type, branches in outputs.items():
+            for index, targets in enumerate(branches or []):
+                for target in targets or []:
+                    dst_type = type_by_name.get(target.get("node")) if isinstance(target, dict) else None
+                    if dst_type is None:
+                        continue
+                    edge = f"e:{src_type}/{conn_type}{index}>{dst_type}"
+                    edges[edge] += 1
+                    shingles.append(f"{edge}:{edges[edge]}")
+    return list(dict.fromkeys(shingles))
+
+
+def minhash_signature(shingles: Iterable[str]) -> Optional[Signature]:
+    """One-permutation MinHash signature (densified) of a shingle set; None when it is empty."""
+    bins = [_EMPTY] * NUM_PERM
+    mask = NUM_PERM - 1
+    for s in shingles:
+        h = int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        b, v = h & mask, h >> _BIN_BITS
+        if v < bins[b]:
+            bins[b] = v
+    filled = [i for i, v in enumerate(bins) if v != _EMPTY]
+    if not filled:
+        return None
+    if len(filled) == NUM_PERM:
+        return tuple(bins)
+    sig = list(bins)
+    # Each empty bin borrows from the next filled one (circularly), offset by the distance.
+    nxt = filled[0] + NUM_PERM
+    for i in range(NUM_PERM - 1, -1, -1):
+        if bins[i] != _EMPTY:
+            nxt = i
+        else:
+            sig[i] = bins[nxt % NUM_PERM] + (nxt - i) * _DENSIFY_STEP
+    return tuple(sig)
+
+
+def estimate_similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity: the fraction of signature positions that agree."""
+    return sum(map(eq, a, b)) / NUM_PERM
+
+
+def _id_key(source_id: str) -> Tuple[int, str]:
+    return (int(source_id), source_id) if source_id.isdigit() else (1 << 62, source_id)
+
+
+def find_clusters(signatures: Dict[str, Signature], threshold: float = DEFAULT_THRESHOLD) -> Dict[str, str]:
+    """
+    Group near-duplicates. Returns {source_id: cluster_id} for templates in clusters of two
+    or more; cluster_id is the lowest source_id in the cluster. Unique templates are omitted.
+    """
+    buckets: Dict[Tuple[int, Signature], List[str]] = defaultdict(list)
+    for source_id, sig in signatures.items():
+        for band in range(LSH_BANDS):
+            buckets[(band, sig[band * LSH_ROWS : (band + 1) * LSH_ROWS])].append(source_id)
+
+    parent: Dict[str, str] = {}
+
+    def find(x: str) -> str:
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent.get(x, x)
+        return root
+
+    compared: set = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        # Compare each member against the bucket's leaders only, so a large bucket of
+        # identical workflows costs O(n) rather than O(n^2) comparisons.
+        leaders: List[str] = []
+        for source_id in members:
+            for leader in leaders:
+                pair = (leader, source_id)
+                if find(leader) == find(source_id):
+                    break
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                if estimate_similarity(signatures[leader], signatures[source_id]) >= threshold:
+                    parent[find(source_id)] = find(leader)
+                    break
+            else:
+                leaders.append(source_id)
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for source_id in set(parent) | set(parent.values()):
+        groups[find(source_id)].append(source_id)
+    clusters: Dict[str, str] = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        representative = min(members, key=_id_key)
+        for source_id in members:
+            clusters[source_id] = representative
+    return clusters
+
+
+def cluster_summary(clusters: Dict[str, str], total: int) -> str:
+    sizes = Counter(clusters.values())
+    duplicates = len(clusters) - len(sizes)
+    largest = max(sizes.values(), default=0)
+    return (
+        f"{total} templates: {len(sizes)} clusters covering {len(clusters)} templates, "
+        f"{duplicates} duplicates ({100.0 * duplicates / total if total else 0.0:.1f}%), largest cluster {largest}"
+    )
+
+
+def save_clusters(clusters: Dict[str, str], path: Path | str = DEFAULT_CLUSTERS_PATH, threshold: float = DEFAULT_THRESHOLD) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"threshold": threshold, "num_perm": NUM_PERM, "clusters": dict(sorted(clusters.items(), key=lambda kv: _id_key(kv[0])))}
+    path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+
+def load_clusters(path: Path | str = DEFAULT_CLUSTERS_PATH) -> Dict[str, str]:
+    """{source_id: cluster_id} saved by `dedup.py local`; empty when there is no file."""
+    p = Path(path)
+    if not p.is_file():
+        return {}
+    return json.loads(p.read_text(encoding="utf-8")).get("clusters") or {}
+
+
+# -- corpus sources -----------------------------------------------------------------------
+
+
+def _local_workflows(templates_dir: Optional[Path], snapshot_dir: Path) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    from corpus_snapshot import TEMPLATES_DIR, CorpusSnapshot, load_rows
+    from json_codec import load_path
+
+    snap = CorpusSnapshot.open(snapshot_dir)
+    if snap is not None and (templates_dir is None or snap.meta.get("templates_dir") == str(Path(templates_dir).resolve())):
+        with snap:
+            for row in snap.rows():
+                yield str(row["source_id"]), snap.raw_workflow(row)
+        return
+    if snap is not None:
+        snap.close()
+    root = Path(templates_dir or TEMPLATES_DIR).resolve()
+    for row in load_rows(root, snapshot_dir):
+        yield str(row["source_id"]), load_path(root / row["path"])
+
+
+def signatures_for(workflows: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Signature]:
+    signatures: Dict[str, Signature] = {}
+    for source_id, workflow in workflows:
+        sig = minhash_signature(workflow_shingles(workflow or {}))
+        if sig is not None:
+            signatures[source_id] = sig
+    return signatures
+
+
+def _write_cluster_ids(client, current: Dict[str, Tuple[Any, Optional[str]]], clusters: Dict[str, str], dry_run: bool) -> int:
+    """
+    Update templates.cluster_id where it changed. `current` maps source_id to (row id,
+    stored cluster_id). Rows are grouped by new value, one UPDATE per group chunk.
+    """
+    by_value: Dict[Optional[str], List[Any]] = defaultdict(list)
+    for source_id, (row_id, stored) in current.items():
+        new = clusters.get(source_id)
+        if new != stored:
+            by_value[new].append(row_id)
+    changed = sum(len(ids) for ids in by_value.values())
+    if dry_run:
+        return changed
+    for value, ids in by_value.items():
+        for i in range(0, len(ids), UPDATE_CHUNK):
+            client.table("templates").update({"cluster_id": value}).in_("id", ids[i : i + UPDATE_CHUNK]).execute()
+    return changed
+
+
+def dedup_supabase(threshold: float = DEFAULT_THRESHOLD, page_size: int = 200, dry_run: bool = False) -> Dict[str, str]:
+    """Cluster every template stored by run.py / run_local.py and write templates.cluster_id."""
+    from upload_to_supabase import get_client, scan_table
+
+    client = get_client()
+    current: Dict[str, Tuple[Any, Optional[str]]] = {}
+
+    def workflows() -> Iterable[Tuple[str, Dict[str, Any]]]:
+        for row in scan_table(client, "templates", "id,source_id,raw_workflow,cluster_id", page_size=page_size):
+            source_id = str(row["source_id"])
+            current[source_id] = (row["id"], row.get("cluster_id"))
+            yield source_id, row.get("raw_workflow") or {}
+
+    started = time.perf_counter()
+    signatures = signatures_for(workflows())
+    clusters = find_clusters(signatures, threshold)
+    logger.info("%s (%.1f s)", cluster_summary(clusters, len(current)), time.perf_counter() - started)
+    changed = _write_cluster_ids(client, current, clusters, dry_run)
+    logger.info("%s cluster_id values %s", changed, "would change" if dry_run else "updated")
+    return clusters
+
+
+def main() -> None:
+    from corpus_snapshot import SNAPSHOT_DIR
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    ap = argparse.ArgumentParser(description="Cluster near-duplicate templates by workflow structure (MinHash/LSH).")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("local", help="Cluster the local corpus and save {source_id: cluster_id}")
+    p.add_argument("--templates-dir", type=Path, default=None)
+    p.add_argument("--snapshot", type=Path, default=SNAPSHOT_DIR)
+    p.add_argument("--out", type=Path, default=DEFAULT_CLUSTERS_PATH)
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Minimum estimated Jaccard similarity")
+    p.add_argument("--show", type=int, default=5, help="Largest clusters to print")
+    p = sub.add_parser("supabase", help="Cluster templates in Supabase and write templates.cluster_id")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Minimum estimated Jaccard similarity")
+    p.add_argument("--page-size", type=int, default=200, help="Templates (with raw_workflow) read per page")
+    p.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    args = ap.parse_args()
+    threshold = min(1.0, max(0.0, args.threshold))
+
+    if args.command == "supabase":
+        dedup_supabase(threshold, page_size=max(1, args.page_size), dry_run=args.dry_run)
+        return
+
+    started = time.perf_counter()
+    signatures = signatures_for(_local_workflows(args.templates_dir, args.snapshot))
+    hashed = time.perf_counter()
+    clusters = find_clusters(signatures, threshold)
+    finished = time.perf_counter()
+    save_clusters(clusters, args.out, threshold)
+    logger.info(cluster_summary(clusters, len(signatures)))
+    logger.info("Signatures %.2f s, LSH + verification %.2f s -> %s", hashed - started, finished - hashed, args.out)
+    members: Dict[str, List[str]] = defaultdict(list)
+    for source_id, cluster_id in clusters.items():
+        members[cluster_id].append(source_id)
+    for cluster_id, ids in sorted(members.items(), key=lambda kv: -len(kv[1]))[: args.show]:
+        logger.info("  cluster %s (%s): %s", cluster_id, len(ids), ", ".join(sorted(ids, key=_id_key)[:10]))
+
+
+if __name__ == "__main__":
+    main()
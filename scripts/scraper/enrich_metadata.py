@@ -7,23 +7,52 @@ For each template row in public.templates:
   - Update category and tags in Supabase (matching on source_id).
 
 This script is safe to re-run; it only updates category and tags.
+
+Usage:
+  python enrich_metadata.py [--workers N] [--rate REQUESTS_PER_SECOND] [--page-size N] [--update-batch-size N]
+                            [--http-cache [PATH]] [--cache-only] [--no-ai-cache]
+                            [--pre-classifier [PATH]] [--pre-classifier-threshold MARGIN]
+
+API fetches for each page run on a bounded thread pool (--workers) and share a token-bucket
+limiter (--rate requests/second, default 3 like run.py's default delay), the next Supabase page
+is prefetched while the current one is processed, and updates are flushed in batches through
+the bulk_update_template_metadata RPC (one round trip per batch; per-row updates if the RPC
+is unavailable). AI categories are memoized in category_cache, so re-runs only send new or
+changed templates to OpenAI. With --pre-classifier, rows a trained pre_classifier model labels
+with at least its calibrated margin skip OpenAI entirely; templates.category_source records
+which step wrote each category, so those labels are not trained on. When templates carry a
+near-duplicate cluster_id (dedup.py), only one row per cluster is sent to OpenAI and its
+category is reused for the rest of the cluster.
 """
 from __future__ import annotations
 
+import argparse
 import logging
-import re
-from typing import Any, Dict, List
-
-import requests
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from normalize import normalize_from_api_payload, derive_category_from_tags_and_text
+from normalize import normalize_from_api_payload, derive_category_from_tags_and_text, keyword_tokens
 from ai_categorizer import categorize_batch
-from upload_to_supabase import get_client
+from upload_to_supabase import get_client, scan_pages
+from json_codec import loads
+from http_cache import configure_cache, get_cache
+from category_cache import configure_category_cache, get_category_cache
+from pre_classifier import SOURCE_PRE_CLASSIFIER, PreClassifier, extract_features, model_path
+from http_client import cached_get
+from rate_limit import TokenBucket
 
 
 API_BASE = "https://api.n8n.io/templates/workflows"
 PAGE_SIZE = 500  # number of templates to fetch per page from Supabase
 TIMEOUT_SECONDS = 15
+DEFAULT_WORKERS = 4  # concurrent API fetches / Supabase updates per page
+DEFAULT_RATE = 3.0  # api.n8n.io requests per second across all workers (run.py: 1 / 0.3 s delay)
+UPDATE_BATCH_SIZE = 500  # rows written back to Supabase per flush
+BULK_UPDATE_RPC = "bulk_update_template_metadata"
+
+# Cleared after the first RPC failure so the rest of the run goes straight to per-row updates.
+_bulk_rpc_available = True
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -67,11 +96,9 @@ def _derive_keyword_tags(title: str, description: str, max_tags: int = 5) -> Lis
     Derive simple keyword-based tags from title and description.
     Very lightweight: split on non-alphanumeric, lowercase, drop stopwords/short tokens.
     """
-    text = f"{title or ''} {description or ''}".lower()
-    tokens = re.split(r"[^a-z0-9]+", text)
     tags: List[str] = []
-    for tok in tokens:
-        if not tok or len(tok) < 3:
+    for tok in keyword_tokens(f"{title or ''} {description or ''}"):
+        if len(tok) < 3:
             continue
         if tok in STOPWORDS:
             continue
@@ -97,132 +124,343 @@ def _merge_tags(primary: List[str], derived: List[str]) -> List[str]:
     return merged
 
 
-def enrich() -> None:
+def _enrich_row(row: Dict[str, Any], limiter: Optional[TokenBucket] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch fresh API metadata for one Supabase row and derive its category and tags.
+    Returns the row info used for the write-back, or None when the row is skipped.
+    Thread-safe; runs on the fetch pool, with `limiter` shared by every worker.
+    """
+    source_id = row.get("source_id")
+    if not source_id:
+        return None
+
+    try:
+        url = f"{API_BASE}/{source_id}"
+        if limiter is not None:
+            limiter.acquire()
+        status, body = cached_get(url, timeout=TIMEOUT_SECONDS)
+        if status != 200:
+            logger.warning("Skipping %s: API returned %s", source_id, status)
+            return None
+
+        api_payload = loads(body)
+        norm = normalize_from_api_payload(api_payload, int(source_id))
+        if not norm:
+            logger.warning("Skipping %s: normalize_from_api_payload returned None", source_id)
+            return None
+
+        # Use normalized category and tags, and optionally enrich with keyword tags.
+        normalized_category = norm.get("category") or ""
+        normalized_tags = list(norm.get("tags") or [])
+
+        derived_tags = _derive_keyword_tags(norm.get("title") or "", norm.get("description") or "")
+        merged_tags = _merge_tags(normalized_tags, derived_tags)
+
+        if not normalized_category:
+            fallback_category = derive_category_from_tags_and_text(
+                merged_tags,
+                norm.get("title") or "",
+                norm.get("description") or "",
+            )
+            if fallback_category:
+                normalized_category = fallback_category
+
+        return {
+            "id": row["id"],
+            "source_id": source_id,
+            "existing_category": row.get("category") or "",
+            "final_category": normalized_category,
+            "final_tags": merged_tags,
+            "title": norm.get("title") or row.get("title") or "",
+            "description": norm.get("description") or row.get("description") or "",
+            "node_types": [nt for nt, _ in norm.get("node_type_counts") or []],
+            "cluster_id": row.get("cluster_id"),
+        }
+    except Exception as e:  # noqa: BLE001
+        logger.exception("Error enriching template %s: %s", source_id, e)
+        return None
+
+
+def _needs_ai(info: Dict[str, Any]) -> bool:
+    """Rows with no category or a catch-all one are refined by AI."""
+    return not info["final_category"] or info["final_category"] in {"Automation & Orchestration", "Other"}
+
+
+def _pre_classify(infos: List[Dict[str, Any]], model: PreClassifier, threshold: Optional[float]) -> int:
+    """Label rows the offline model is confident about; returns how many were labelled."""
+    labelled = 0
+    for info in infos:
+        features = extract_features(info["title"], info["final_tags"], info["node_types"])
+        category = model.confident(features, threshold)
+        if category:
+            info["final_category"] = category
+            info["category_source"] = SOURCE_PRE_CLASSIFIER
+            labelled += 1
+    return labelled
+
+
+def _has_column(client, column: str) -> bool:
+    """True when templates.<column> exists (cluster_id: 20250223000001, category_source: 20250224000001)."""
+    try:
+        client.table("templates").select(column).limit(1).execute()
+        return True
+    except Exception as e:  # noqa: BLE001
+        logger.info("templates.%s not available (%s)", column, e)
+        return False
+
+
+def _split_by_cluster(
+    infos: List[Dict[str, Any]], cluster_categories: Dict[str, str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Rows that still need AI: apply categories already decided for their cluster, then keep one
+    row per remaining cluster. Returns (rows to send, rows that take their cluster's answer).
+    """
+    leaders: List[Dict[str, Any]] = []
+    followers: List[Dict[str, Any]] = []
+    pending: set = set()
+    for info in infos:
+        cluster = info.get("cluster_id")
+        if not cluster:
+            leaders.append(info)
+        elif cluster in cluster_categories:
+            info["final_category"] = cluster_categories[cluster]
+            info["category_source"] = "ai"
+        elif cluster in pending:
+            followers.append(info)
+        else:
+            pending.add(cluster)
+            leaders.append(info)
+    return leaders, followers
+
+
+def _build_update(info: Dict[str, Any], ai_categories: Dict[str, str], track_source: bool = False) -> Dict[str, Any]:
+    """
+    Return the columns to write for one row (empty when nothing changed). With `track_source`,
+    a new category comes with its category_source ("rules", "ai" or "pre_classifier").
+    """
+    final_category = info["final_category"]
+    source = info.get("category_source") or "rules"
+    # If AI produced a category for this row, prefer it.
+    ai_cat = ai_categories.get(str(info["id"]))
+    if ai_cat:
+        final_category = ai_cat
+        source = "ai"
+
+    update_data: Dict[str, Any] = {}
+    if final_category and final_category != info["existing_category"]:
+        update_data["category"] = final_category
+        if track_source:
+            update_data["category_source"] = source
+    if info["final_tags"]:
+        update_data["tags"] = info["final_tags"]
+    return update_data
+
+
+def _update_rows(client, updates: List[Tuple[Dict[str, Any], Dict[str, Any]]], pool: ThreadPoolExecutor) -> int:
+    """Per-row fallback: one UPDATE per row on the shared pool. Returns rows written."""
+
+    def write(pair: Tuple[Dict[str, Any], Dict[str, Any]]) -> bool:
+        info, update_data = pair
+        try:
+            client.table("templates").update(update_data).eq("id", info["id"]).execute()
+            return True
+        except Exception as e:  # noqa: BLE001
+            logger.exception("Error updating template %s in Supabase: %s", info["source_id"], e)
+            return False
+
+    return sum(pool.map(write, updates))
+
+
+def _flush_updates(client, updates: List[Tuple[Dict[str, Any], Dict[str, Any]]], pool: ThreadPoolExecutor) -> int:
+    """
+    Write a batch of (row_info, update_data) pairs to Supabase in one round trip via the
+    bulk_update_template_metadata RPC. Rows are isolated server-side; failed rows are logged.
+    If the RPC itself fails (e.g. migration not applied), falls back to per-row updates.
+    Returns the number of rows written.
+    """
+    global _bulk_rpc_available
+    if not updates:
+        return 0
+    if _bulk_rpc_available:
+        payload = [{"id": info["id"], **update_data} for info, update_data in updates]
+        try:
+            resp = client.rpc(BULK_UPDATE_RPC, {"updates": payload}).execute()
+        except Exception as e:  # noqa: BLE001
+            logger.warning("%s failed (%s); falling back to per-row updates", BULK_UPDATE_RPC, e)
+            _bulk_rpc_available = False
+        else:
+            result = resp.data or {}
+            source_ids = {str(info["id"]): info["source_id"] for info, _ in updates}
+            for failure in result.get("failed") or []:
+                row_id = str(failure.get("id"))
+                logger.error(
+                    "Error updating template %s in Supabase: %s", source_ids.get(row_id, row_id), failure.get("error")
+                )
+            return int(result.get("updated") or 0)
+    return _update_rows(client, updates, pool)
+
+
+def enrich(
+    workers: int = DEFAULT_WORKERS,
+    rate: float = DEFAULT_RATE,
+    page_size: int = PAGE_SIZE,
+    update_batch_size: int = UPDATE_BATCH_SIZE,
+    pre_classifier: Optional[PreClassifier] = None,
+    pre_classifier_threshold: Optional[float] = None,
+) -> None:
+    """
+    Re-enrich every template. API fetches for a page run on a pool of `workers` threads,
+    the next Supabase page is prefetched while the current one is processed, and updates
+    are written in batches of `update_batch_size`. workers=1 processes rows serially.
+    API requests from all workers together stay under `rate` per second (<= 0: unlimited).
+    With a `pre_classifier`, rows it labels with a margin >= `pre_classifier_threshold`
+    (default: the model's calibrated threshold) are not sent to OpenAI. It is only used when
+    templates.category_source exists, so its labels can be kept out of training.
+    """
     client = get_client()
+    workers = max(1, workers)
+    page_size = max(1, page_size)
+    update_batch_size = max(1, update_batch_size)
+    # --cache-only runs never reach the network, so they are not throttled.
+    cache = get_cache()
+    limiter = TokenBucket(0.0 if cache is not None and cache.cache_only else rate)
 
-    offset = 0
     total_updated = 0
     total_skipped = 0
-
-    while True:
-        logger.info("Fetching templates batch from Supabase (offset=%s, limit=%s)...", offset, PAGE_SIZE)
-        resp = client.table("templates").select(
-            "id,source_id,title,description,category,tags"
-        ).range(offset, offset + PAGE_SIZE - 1).execute()
-        rows: List[Dict[str, Any]] = resp.data or []
-
-        if not rows:
-            break
-
-        # Collect per-row info and items that need AI categorization.
-        row_infos: List[Dict[str, Any]] = []
-        ai_items: List[Dict[str, Any]] = []
-
-        for row in rows:
-            source_id = row.get("source_id")
-            if not source_id:
-                total_skipped += 1
-                continue
-
-            try:
-                url = f"{API_BASE}/{source_id}"
-                r = requests.get(url, timeout=TIMEOUT_SECONDS)
-                if r.status_code != 200:
-                    logger.warning("Skipping %s: API returned %s", source_id, r.status_code)
-                    total_skipped += 1
-                    continue
-
-                api_payload = r.json()
-                norm = normalize_from_api_payload(api_payload, int(source_id))
-                if not norm:
-                    logger.warning("Skipping %s: normalize_from_api_payload returned None", source_id)
-                    total_skipped += 1
-                    continue
-
-                # Use normalized category and tags, and optionally enrich with keyword tags.
-                normalized_category = norm.get("category") or ""
-                normalized_tags = list(norm.get("tags") or [])
-
-                derived_tags = _derive_keyword_tags(norm.get("title") or "", norm.get("description") or "")
-                merged_tags = _merge_tags(normalized_tags, derived_tags)
-
-                if not normalized_category:
-                    fallback_category = derive_category_from_tags_and_text(
-                        merged_tags,
-                        norm.get("title") or "",
-                        norm.get("description") or "",
-                    )
-                    if fallback_category:
-                        normalized_category = fallback_category
-
-                row_info = {
-                    "id": row["id"],
-                    "source_id": source_id,
-                    "existing_category": row.get("category") or "",
-                    "final_category": normalized_category,
-                    "final_tags": merged_tags,
-                    "title": norm.get("title") or row.get("title") or "",
-                    "description": norm.get("description") or row.get("description") or "",
-                    # node_types could be passed in later if needed
-                    "node_types": [],
+    total_pre_classified = 0
+    total_ai = 0
+    total_cluster_shared = 0
+    # cluster_id -> AI category of the first row of that cluster seen this run.
+    cluster_categories: Dict[str, str] = {}
+    started = time.monotonic()
+
+    processed = 0
+    columns = "id,source_id,title,description,category,tags"
+    if _has_column(client, "cluster_id"):
+        columns += ",cluster_id"
+    else:
+        logger.info("Categorizing every row on its own (no near-duplicate clusters)")
+    track_source = _has_column(client, "category_source")
+    if pre_classifier is not None and not track_source:
+        logger.warning("Pre-classifier disabled: its labels could not be told apart from training data "
+                       "(apply migration 20250224000001)")
+        pre_classifier = None
+    pages = scan_pages(client, "templates", columns, page_size=page_size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_page: Future = prefetcher.submit(next, pages, None)
+
+        while True:
+            rows = next_page.result()
+            if not rows:
+                break
+            processed += len(rows)
+            # Start loading the next page while this one is enriched.
+            next_page = prefetcher.submit(next, pages, None)
+
+            # map() keeps row order, so logs and updates follow the table order.
+            row_infos = [info for info in pool.map(lambda row: _enrich_row(row, limiter), rows) if info is not None]
+            total_skipped += len(rows) - len(row_infos)
+
+            if pre_classifier is not None:
+                total_pre_classified += _pre_classify(
+                    [info for info in row_infos if _needs_ai(info)], pre_classifier, pre_classifier_threshold
+                )
+
+            # Call OpenAI in batches for rows that still need better categories, one per cluster.
+            needs_ai = [info for info in row_infos if _needs_ai(info)]
+            leaders, followers = _split_by_cluster(needs_ai, cluster_categories)
+            total_cluster_shared += len(needs_ai) - len(leaders)
+            ai_items = [
+                {
+                    "id": info["id"],
+                    "title": info["title"],
+                    "description": info["description"],
+                    "tags": info["final_tags"],
+                    "node_types": info["node_types"],
                 }
-                row_infos.append(row_info)
-
-                # Decide if this row should be refined by AI.
-                if not normalized_category or normalized_category in {"Automation & Orchestration", "Other"}:
-                    ai_items.append(
-                        {
-                            "id": row_info["id"],
-                            "title": row_info["title"],
-                            "description": row_info["description"],
-                            "tags": row_info["final_tags"],
-                            "node_types": row_info["node_types"],
-                        }
-                    )
-            except Exception as e:  # noqa: BLE001
-                logger.exception("Error enriching template %s: %s", source_id, e)
-                total_skipped += 1
-
-        # Call OpenAI in batches for rows that still need better categories.
-        ai_categories: Dict[str, str] = {}
-        if ai_items:
-            ai_categories = categorize_batch(ai_items)
-
-        # Apply updates back to Supabase.
-        for info in row_infos:
-            row_id = info["id"]
-            existing_category = info["existing_category"]
-            final_category = info["final_category"]
-
-            # If AI produced a category for this row, prefer it.
-            ai_cat = ai_categories.get(str(row_id))
-            if ai_cat:
-                final_category = ai_cat
-
-            update_data: Dict[str, Any] = {}
-            if final_category and final_category != existing_category:
-                update_data["category"] = final_category
-            if info["final_tags"]:
-                update_data["tags"] = info["final_tags"]
-
-            if not update_data:
-                total_skipped += 1
-                continue
-
-            try:
-                client.table("templates").update(update_data).eq("id", row_id).execute()
-                total_updated += 1
-            except Exception as e:  # noqa: BLE001
-                logger.exception("Error updating template %s in Supabase: %s", info["source_id"], e)
-                total_skipped += 1
-
-        offset += len(rows)
-        if len(rows) < PAGE_SIZE:
-            break
+                for info in leaders
+            ]
+            total_ai += len(ai_items)
+            ai_categories: Dict[str, str] = categorize_batch(ai_items) if ai_items else {}
+            for info in leaders:
+                if info.get("cluster_id") and ai_categories.get(str(info["id"])):
+                    cluster_categories[info["cluster_id"]] = ai_categories[str(info["id"])]
+            for info in followers:
+                if cluster_categories.get(info["cluster_id"]):
+                    info["final_category"] = cluster_categories[info["cluster_id"]]
+                    info["category_source"] = "ai"
+
+            # Apply updates back to Supabase.
+            updates: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+            for info in row_infos:
+                update_data = _build_update(info, ai_categories, track_source)
+                if update_data:
+                    updates.append((info, update_data))
+                else:
+                    total_skipped += 1
+            for i in range(0, len(updates), update_batch_size):
+                chunk = updates[i : i + update_batch_size]
+                written = _flush_updates(client, chunk, pool)
+                total_updated += written
+                total_skipped += len(chunk) - written
+
+            elapsed = time.monotonic() - started
+            logger.info(
+                "Processed %s rows (updated=%s, skipped=%s, %.1f rows/s)",
+                processed, total_updated, total_skipped, processed / elapsed if elapsed > 0 else 0.0,
+            )
 
     logger.info("Enrichment complete. Updated=%s, Skipped=%s", total_updated, total_skipped)
+    logger.info(
+        "Categorization: pre-classified=%s, sent to AI=%s, shared within clusters=%s",
+        total_pre_classified, total_ai, total_cluster_shared,
+    )
+    cache = get_cache()
+    if cache is not None:
+        logger.info(cache.stats_summary())
+    category_cache = get_category_cache()
+    if category_cache is not None:
+        logger.info(category_cache.stats_summary())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Enrich templates in Supabase with category and tags.")
+    ap.add_argument("--http-cache", nargs="?", const="", default=None, metavar="PATH",
+                    help="Cache api.n8n.io responses on disk (default path: scripts/scraper/.http_cache.sqlite)")
+    ap.add_argument("--cache-only", action="store_true", help="Serve API responses from the cache only; no network")
+    ap.add_argument("--no-ai-cache", action="store_true", help="Send every item to OpenAI; ignore cached AI categories")
+    ap.add_argument("--pre-classifier", nargs="?", const="", default=None, metavar="PATH",
+                    help="Label confident rows with the offline model before OpenAI "
+                         "(default path: PRE_CLASSIFIER_MODEL or scripts/scraper/.pre_classifier.json)")
+    ap.add_argument("--pre-classifier-threshold", type=float, default=None, metavar="MARGIN",
+                    help="Override the model's calibrated margin threshold")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent API fetches and Supabase updates (1 = serial)")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Max api.n8n.io requests per second across workers (0 = unlimited)")
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Templates read from Supabase per page")
+    ap.add_argument("--update-batch-size", type=int, default=UPDATE_BATCH_SIZE, help="Rows written back per flush")
+    args = ap.parse_args()
+    if args.http_cache is not None or args.cache_only:
+        configure_cache(args.http_cache or None, cache_only=args.cache_only)
+    if args.no_ai_cache:
+        configure_category_cache(enabled=False)
+    pre_classifier = None
+    if args.pre_classifier is not None:
+        path = model_path(args.pre_classifier or None)
+        pre_classifier = PreClassifier.load(path)
+        if pre_classifier is None:
+            logger.warning("No pre-classifier model at %s; every uncertain row goes to OpenAI", path)
+    enrich(
+        workers=args.workers,
+        rate=args.rate,
+        page_size=args.page_size,
+        update_batch_size=args.update_batch_size,
+        pre_classifier=pre_classifier,
+        pre_classifier_threshold=args.pre_classifier_threshold,
+    )
 
 
 if __name__ == "__main__":
-    enrich()
+    main()
 
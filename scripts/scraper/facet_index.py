@@ -0,0 +1,233 @@
+"""
+Faceted index over the local template corpus: node types, categories and tags.
+Templates without a category (all local files) get derive_category_from_tags_and_text's.
+
+Each facet value ("node:n8n-nodes-base.slack", "category:AI & LLMs", "tag:ai") maps to a
+bitmap of template ordinals. Bitmaps are Python ints (bit i = template i), so AND / OR / NOT
+run in C over the whole corpus at once and int.bit_count() gives cardinalities; on disk each
+bitmap is stored zlib-compressed. "Templates using Slack AND OpenAI but not Gmail" is three
+bitmap operations, and facet_counts() counts every value of a facet against a result set in
+one pass.
+
+Node types can be given as the full type or the short name ("slack", "openAi"); a short name
+covers every package that has it (e.g. n8n-nodes-base.openAi and @n8n/n8n-nodes-langchain.openAi).
+
+Usage:
+  python facet_index.py build [--templates-dir PATH] [--snapshot DIR] [--out FILE]
+  python facet_index.py query [--all slack openAi] [--any ...] [--not gmail]
+                              [--category C] [--tag T] [--counts node|category|tag] [--top 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import struct
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from normalize import derive_category_from_tags_and_text
+from search_index import node_name
+
+DEFAULT_FACET_PATH = Path(__file__).resolve().parent / ".corpus" / "facets.idx"
+MAGIC = b"N8NFIX1\n"
+KINDS = ("node", "category", "tag")
+
+
+class FacetIndex:
+    """Bitmap per facet value. Build with FacetIndex.build(rows) or load with FacetIndex.load(path)."""
+
+    def __init__(self, docs: List[Dict[str, Any]], bitmaps: Dict[str, int]) -> None:
+        self.docs = docs
+        self.bitmaps = bitmaps
+        self.universe = (1 << len(docs)) - 1
+        self._by_short_node: Dict[str, List[str]] = defaultdict(list)
+        for key in bitmaps:
+            if key.startswith("node:"):
+                self._by_short_node[node_name(key[5:]).lower()].append(key)
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> "FacetIndex":
+        docs: List[Dict[str, Any]] = []
+        ordinals: Dict[str, List[int]] = defaultdict(list)
+        for row in rows:
+            i = len(docs)
+            docs.append({"source_id": row.get("source_id"), "title": row.get("title") or ""})
+            for nt, _ in row.get("node_type_counts") or []:
+                ordinals[f"node:{nt}"].append(i)
+            category = row.get("category") or derive_category_from_tags_and_text(
+                row.get("tags") or [], row.get("title") or "", row.get("description") or ""
+            )
+            if category:
+                ordinals[f"category:{category}"].append(i)
+            for tag in dict.fromkeys(str(t).strip().lower() for t in row.get("tags") or []):
+                if tag:
+                    ordinals[f"tag:{tag}"].append(i)
+        return cls(docs, {key: _bitmap(ids) for key, ids in ordinals.items()})
+
+    def save(self, path: Path | str = DEFAULT_FACET_PATH) -> None:
+        entries: Dict[str, List[int]] = {}
+        chunks: List[bytes] = []
+        offset = 0
+        for key in sorted(self.bitmaps):
+            bm = self.bitmaps[key]
+            blob = zlib.compress(bm.to_bytes((bm.bit_length() + 7) // 8, "little"))
+            entries[key] = [offset, len(blob)]
+            chunks.append(blob)
+            offset += len(blob)
+        raw_header = json.dumps({"docs": self.docs, "facets": entries}, separators=(",", ":")).encode("utf-8")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(raw_header)))
+            f.write(raw_header)
+            for chunk in chunks:
+                f.write(chunk)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path | str = DEFAULT_FACET_PATH) -> Optional["FacetIndex"]:
+        p = Path(path)
+        if not p.is_file():
+            return None
+        data = p.read_bytes()
+        if not data.startswith(MAGIC):
+            return None
+        (header_len,) = struct.unpack_from("<Q", data, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(data[start : start + header_len])
+        body = memoryview(data)[start + header_len :]
+        bitmaps = {
+            key: int.from_bytes(zlib.decompress(body[off : off + length]), "little")
+            for key, (off, length) in header["facets"].items()
+        }
+        return cls(header["docs"], bitmaps)
+
+    # -- queries ------------------------------------------------------------------------
+
+    def bitmap(self, kind: str, value: str) -> int:
+        """Bitmap for one facet value (0 when unknown). Node values may be short names."""
+        if kind == "node":
+            if f"node:{value}" in self.bitmaps:
+                return self.bitmaps[f"node:{value}"]
+            bm = 0
+            for key in self._by_short_node.get(value.lower(), []):
+                bm |= self.bitmaps[key]
+            return bm
+        if kind == "tag":
+            value = value.strip().lower()
+        return self.bitmaps.get(f"{kind}:{value}", 0)
+
+    def query(
+        self,
+        all_of: Iterable[Tuple[str, str]] = (),
+        any_of: Iterable[Tuple[str, str]] = (),
+        none_of: Iterable[Tuple[str, str]] = (),
+    ) -> int:
+        """
+        Bitmap of templates matching every (kind, value) in all_of, at least one in any_of
+        (when given) and none in none_of.
+        """
+        result = self.universe
+        for kind, value in all_of:
+            result &= self.bitmap(kind, value)
+        any_list = list(any_of)
+        if any_list:
+            union = 0
+            for kind, value in any_list:
+                union |= self.bitmap(kind, value)
+            result &= union
+        for kind, value in none_of:
+            result &= ~self.bitmap(kind, value)
+        return result & self.universe
+
+    def facet_counts(self, result: int, kind: str = "node", top: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(value, count) for every value of `kind` present in `result`, largest first."""
+        prefix = f"{kind}:"
+        counts = [
+            (key[len(prefix):], (bm & result).bit_count())
+            for key, bm in self.bitmaps.items()
+            if key.startswith(prefix)
+        ]
+        counts = [c for c in counts if c[1]]
+        counts.sort(key=lambda c: (-c[1], c[0]))
+        return counts[:top] if top else counts
+
+    def ordinals(self, result: int) -> Iterator[int]:
+        """Template ordinals set in `result`, ascending."""
+        while result:
+            low = result & -result
+            yield low.bit_length() - 1
+            result ^= low
+
+
+def _bitmap(ordinals: Iterable[int]) -> int:
+    # Build through a bytearray: setting bits on an int one by one is quadratic.
+    ids = list(ordinals)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def main() -> None:
+    from corpus_snapshot import SNAPSHOT_DIR, load_rows
+
+    ap = argparse.ArgumentParser(description="Build or query the node-type / category / tag facet index.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="Index the local corpus (from the snapshot when available)")
+    p.add_argument("--templates-dir", type=Path, default=None)
+    p.add_argument("--snapshot", type=Path, default=SNAPSHOT_DIR)
+    p.add_argument("--out", type=Path, default=DEFAULT_FACET_PATH)
+    p = sub.add_parser("query", help="Filter templates by node types, category and tags")
+    p.add_argument("--index", type=Path, default=DEFAULT_FACET_PATH)
+    p.add_argument("--all", nargs="*", default=[], metavar="NODE", help="Node types that must all be present")
+    p.add_argument("--any", nargs="*", default=[], metavar="NODE", help="At least one of these node types")
+    p.add_argument("--not", dest="none", nargs="*", default=[], metavar="NODE", help="Node types that must be absent")
+    p.add_argument("--category", default=None)
+    p.add_argument("--tag", default=None)
+    p.add_argument("--counts", choices=KINDS, default="node", help="Facet to count over the result")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--show", type=int, default=10, help="Matching templates to list")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = FacetIndex.build(load_rows(args.templates_dir, args.snapshot))
+        index.save(args.out)
+        print(f"Indexed {len(index.docs)} templates, {len(index.bitmaps)} facet values "
+              f"in {time.perf_counter() - started:.2f} s -> {args.out}")
+        return
+
+    index = FacetIndex.load(args.index)
+    if index is None:
+        print(f"No facet index at {args.index}; run: python facet_index.py build")
+        return
+    all_of = [("node", v) for v in args.all]
+    if args.category:
+        all_of.append(("category", args.category))
+    if args.tag:
+        all_of.append(("tag", args.tag))
+    started = time.perf_counter()
+    result = index.query(all_of, [("node", v) for v in args.any], [("node", v) for v in args.none])
+    counts = index.facet_counts(result, args.counts, top=args.top)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"{result.bit_count()} templates match ({elapsed_ms:.2f} ms incl. {args.counts} counts)")
+    for i, ordinal in enumerate(index.ordinals(result)):
+        if i >= args.show:
+            break
+        doc = index.docs[ordinal]
+        print(f"  {doc['source_id']:<10} {doc['title'][:80]}")
+    print(f"Top {args.counts} values:")
+    for value, count in counts:
+        print(f"  {count:6d}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,20 @@
 """
 Fetch full workflow JSON for a single template from api.n8n.io/templates/workflows/<id>.
 """
+import asyncio
 import time
 import requests
 
+from http_client import DEFAULT_TIMEOUT, cached_get, cached_get_async, httpx
+from json_codec import loads
+
 API_BASE = "https://api.n8n.io"
 MAX_RETRIES = 3
 RETRY_DELAY = 1
 
 
-def fetch_workflow(template_id: int) -> dict | None:
-    """Returns raw workflow JSON (nodes, connections, meta, etc.) or None on failure."""
-    url = f"{API_BASE}/templates/workflows/{template_id}"
-    last_err = None
-    for attempt in range(MAX_RETRIES):
-        try:
-            resp = requests.get(
-                url,
-                timeout=60,
-                headers={"Accept": "application/json", "User-Agent": "n8n-template-scraper/1.0"},
-            )
-            if resp.status_code != 200:
-                return None
-            try:
-                data = resp.json()
-            except ValueError:
-                # Non-JSON or empty response
-                return None
-            break
-        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, OSError) as e:
-            last_err = e
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-            else:
-                return None
+def _unwrap_workflow(data) -> dict | None:
+    """Return the inner workflow (nodes, connections, ...) from an API payload, or None."""
     # API wraps in workflow.workflow; be defensive about shapes.
     if not isinstance(data, dict):
         return None
@@ -51,6 +32,56 @@ def fetch_workflow(template_id: int) -> dict | None:
     return None
 
 
+def fetch_template_payload(template_id: int, timeout: float = DEFAULT_TIMEOUT) -> dict | None:
+    """
+    Returns the full API payload for a template ({"workflow": {...}, ...}) or None on failure.
+    Goes through the shared connection pool and the optional response cache.
+    """
+    url = f"{API_BASE}/templates/workflows/{template_id}"
+    for attempt in range(MAX_RETRIES):
+        try:
+            status, body = cached_get(url, timeout=timeout)
+            if status != 200:
+                return None
+            try:
+                data = loads(body)
+            except ValueError:
+                # Non-JSON or empty response
+                return None
+            return data if isinstance(data, dict) else None
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, OSError):
+            if attempt < MAX_RETRIES - 1:
+                time.sleep(RETRY_DELAY)
+    return None
+
+
+def fetch_workflow(template_id: int) -> dict | None:
+    """Returns raw workflow JSON (nodes, connections, meta, etc.) or None on failure."""
+    return _unwrap_workflow(fetch_template_payload(template_id))
+
+
+async def fetch_workflow_async(client: "httpx.AsyncClient", template_id: int) -> dict | None:
+    """
+    Async variant of fetch_workflow. `client` comes from http_client.create_async_client()
+    and should be shared across calls so connections are reused.
+    """
+    url = f"{API_BASE}/templates/workflows/{template_id}"
+    for attempt in range(MAX_RETRIES):
+        try:
+            status, body = await cached_get_async(client, url)
+            if status != 200:
+                return None
+            try:
+                data = loads(body)
+            except ValueError:
+                return None
+            return _unwrap_workflow(data)
+        except (httpx.TransportError, OSError):
+            if attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(RETRY_DELAY)
+    return None
+
+
 if __name__ == "__main__":
     import json
     import sys
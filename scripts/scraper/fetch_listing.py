@@ -2,57 +2,172 @@
 Fetch template listing from official n8n API (api.n8n.io/templates/search).
 Returns list of workflow IDs and basic metadata for fetching details.
 """
+import asyncio
+import math
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+from http_cache import get_cache
+from http_client import (
+    CACHE_ONLY_MISS_STATUS,
+    DEFAULT_TIMEOUT,
+    HttpStatusError,
+    cached_get,
+    cached_get_async,
+    create_async_client,
+    httpx,
+)
+from json_codec import loads
+
 API_BASE = "https://api.n8n.io"
 SEARCH_URL = f"{API_BASE}/templates/search"
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+MAX_PARALLEL_PAGES = 4
+
+
+def _status_error(status: int, page: int) -> tuple[HttpStatusError, bool]:
+    """
+    The error for a failed listing response and whether retrying can help: only 5xx from
+    the server. 4xx and cache-only misses (nothing to retry against) fail straight away.
+    """
+    cache = get_cache()
+    if status == CACHE_ONLY_MISS_STATUS and cache is not None and cache.cache_only:
+        return HttpStatusError(f"{SEARCH_URL} page={page} not in cache (cache-only mode)"), False
+    return HttpStatusError(f"{status} for {SEARCH_URL} page={page}"), status >= 500
 
 
 def fetch_page(page: int = 1, rows: int = 50) -> dict:
+    """One listing page. Transport errors and 5xx are retried; other failures raise at once."""
     last_err = None
     for attempt in range(MAX_RETRIES):
         try:
-            resp = requests.get(
-                SEARCH_URL,
-                params={"page": page, "rows": rows},
-                timeout=60,
-                headers={"Accept": "application/json", "User-Agent": "n8n-template-scraper/1.0"},
-            )
-            resp.raise_for_status()
-            return resp.json()
+            status, body = cached_get(SEARCH_URL, params={"page": page, "rows": rows}, timeout=DEFAULT_TIMEOUT)
         except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, OSError) as e:
             last_err = e
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-            else:
+        else:
+            if status < 400:
+                return loads(body)
+            last_err, retryable = _status_error(status, page)
+            if not retryable:
                 raise last_err
+        if attempt < MAX_RETRIES - 1:
+            time.sleep(RETRY_DELAY)
     raise last_err
 
 
-def fetch_all_listings(rows_per_page: int = 100) -> list[dict]:
-    """Paginate through all workflow listings. Returns list of workflow summary dicts."""
-    out = []
-    page = 1
-    while True:
-        data = fetch_page(page=page, rows=rows_per_page)
-        workflows = data.get("workflows") or []
-        total = data.get("totalWorkflows", 0)
-        for w in workflows:
-            out.append({
-                "id": w["id"],
-                "name": w.get("name", ""),
-                "description": w.get("description", ""),
-                "totalViews": w.get("totalViews", 0),
-            })
-        if not workflows or len(out) >= total:
-            break
-        page += 1
+async def fetch_page_async(client: "httpx.AsyncClient", page: int = 1, rows: int = 50) -> dict:
+    """Async variant of fetch_page using a shared httpx.AsyncClient."""
+    last_err = None
+    for attempt in range(MAX_RETRIES):
+        try:
+            status, body = await cached_get_async(client, SEARCH_URL, params={"page": page, "rows": rows})
+        except (httpx.TransportError, OSError) as e:
+            last_err = e
+        else:
+            if status < 400:
+                return loads(body)
+            last_err, retryable = _status_error(status, page)
+            if not retryable:
+                raise last_err
+        if attempt < MAX_RETRIES - 1:
+            await asyncio.sleep(RETRY_DELAY)
+    raise last_err
+
+
+def _summarize(w: dict) -> dict:
+    return {
+        "id": w["id"],
+        "name": w.get("name", ""),
+        "description": w.get("description", ""),
+        "totalViews": w.get("totalViews", 0),
+    }
+
+
+def _collect(pages: list[dict]) -> list[dict]:
+    """Flatten listing pages (in order) into workflow summaries, de-duplicating by id."""
+    out: list[dict] = []
+    seen: set = set()
+    for data in pages:
+        for w in data.get("workflows") or []:
+            if w["id"] in seen:
+                continue
+            seen.add(w["id"])
+            out.append(_summarize(w))
     return out
 
 
+def _total(first: dict) -> int:
+    return first.get("totalWorkflows", 0) or 0
+
+
+def _page_count(first: dict, rows_per_page: int) -> int:
+    """
+    Pages needed for totalWorkflows. The page size is what the server actually returned on
+    page 1, since it may cap rows per page below `rows_per_page`.
+    """
+    returned = len(first.get("workflows") or [])
+    if not returned:
+        return 1
+    return max(1, math.ceil(_total(first) / min(returned, rows_per_page)))
+
+
+def _short(pages: list[dict], total: int) -> bool:
+    """True while the pages fetched so far hold fewer workflows than the listing's total."""
+    return bool(pages[-1].get("workflows")) and sum(len(p.get("workflows") or []) for p in pages) < total
+
+
+def fetch_all_listings(rows_per_page: int = 100, max_workers: int = MAX_PARALLEL_PAGES) -> list[dict]:
+    """
+    Paginate through all workflow listings. Returns list of workflow summary dicts.
+    The first page's totalWorkflows and size determine the page count; remaining pages are
+    fetched concurrently (up to max_workers at a time) and reassembled in page order. If
+    they still hold fewer than totalWorkflows, later pages are fetched one at a time until
+    the total is reached or a page comes back empty.
+    """
+    first = fetch_page(page=1, rows=rows_per_page)
+    num_pages = _page_count(first, rows_per_page)
+    pages = [first]
+    if num_pages > 1:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            pages.extend(executor.map(lambda p: fetch_page(page=p, rows=rows_per_page), range(2, num_pages + 1)))
+    while _short(pages, _total(first)):
+        pages.append(fetch_page(page=len(pages) + 1, rows=rows_per_page))
+
+    return _collect(pages)
+
+
+async def fetch_all_listings_async(
+    rows_per_page: int = 100,
+    client: "httpx.AsyncClient | None" = None,
+    max_connections: int | None = None,
+    max_parallel: int = MAX_PARALLEL_PAGES,
+) -> list[dict]:
+    """
+    Async variant of fetch_all_listings. Pass a shared client to reuse its connection pool;
+    otherwise a client with `max_connections` is created for the duration of the call.
+    """
+    if client is None:
+        async with create_async_client(max_connections) as own_client:
+            return await fetch_all_listings_async(rows_per_page, client=own_client, max_parallel=max_parallel)
+
+    first = await fetch_page_async(client, page=1, rows=rows_per_page)
+    num_pages = _page_count(first, rows_per_page)
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def _fetch(page: int) -> dict:
+        async with semaphore:
+            return await fetch_page_async(client, page=page, rows=rows_per_page)
+
+    pages = [first, *await asyncio.gather(*(_fetch(p) for p in range(2, num_pages + 1)))]
+    while _short(pages, _total(first)):
+        pages.append(await fetch_page_async(client, page=len(pages) + 1, rows=rows_per_page))
+
+    return _collect(pages)
+
+
 if __name__ == "__main__":
     import json
     listings = fetch_all_listings(rows_per_page=50)
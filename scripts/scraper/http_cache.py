@@ -0,0 +1,189 @@
+"""
+Local on-disk cache for api.n8n.io responses.
+
+Entries are stored in a single SQLite file keyed by a SHA-256 of the full request URL
+(including query string). Each entry keeps the response body plus its ETag / Last-Modified
+headers, so expired entries can be revalidated with a conditional request instead of a
+full download. The cache is size-bounded: least recently used entries are evicted once
+the total body size exceeds the limit.
+
+Configuration (env, or configure_cache() from a CLI flag):
+  SCRAPER_HTTP_CACHE          path to the SQLite file; unset/empty = cache disabled
+  SCRAPER_HTTP_CACHE_TTL      seconds an entry is served without revalidation (default 86400)
+  SCRAPER_HTTP_CACHE_MAX_MB   size limit for cached bodies (default 1024)
+
+In cache-only mode no network requests are made: hits are served regardless of age and
+misses behave like a failed request.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".http_cache.sqlite"
+DEFAULT_TTL_SECONDS = 86400
+DEFAULT_MAX_MB = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+"""
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    """Thread-safe SQLite response cache with TTL and LRU size bound."""
+
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        cache_only: bool = False,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.cache_only or entry.age() < self.ttl_seconds
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        key = cache_key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return CacheEntry(url=row[0], body=bytes(row[1]), etag=row[2], last_modified=row[3], fetched_at=row[4])
+
+    def put(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        key = cache_key(url)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, etag, last_modified, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, etag, last_modified, now, now, len(body)),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def touch(self, url: str) -> None:
+        """Mark an entry as freshly validated (after a 304 Not Modified)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, last_access = ? WHERE key = ?", (now, now, cache_key(url))
+            )
+            self.revalidated += 1
+
+    def _evict(self) -> None:
+        # Evict least recently used entries down to 90% of the limit, so we don't evict on every put.
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats_summary(self) -> str:
+        return f"http cache: hits={self.hits} misses={self.misses} revalidated={self.revalidated} size={self._total / 1e6:.1f} MB"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[HttpCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def _build_cache(path: Path | str | None, cache_only: bool) -> HttpCache:
+    resolved = path or os.environ.get("SCRAPER_HTTP_CACHE") or DEFAULT_CACHE_PATH
+    ttl = _env_float("SCRAPER_HTTP_CACHE_TTL", DEFAULT_TTL_SECONDS)
+    max_mb = _env_float("SCRAPER_HTTP_CACHE_MAX_MB", DEFAULT_MAX_MB)
+    return HttpCache(resolved, ttl_seconds=ttl, max_bytes=int(max_mb * 1024 * 1024), cache_only=cache_only)
+
+
+def configure_cache(path: Path | str | None = None, cache_only: bool = False) -> HttpCache:
+    """
+    Enable the cache explicitly (e.g. from a --http-cache / --cache-only flag).
+    path None falls back to SCRAPER_HTTP_CACHE, then to DEFAULT_CACHE_PATH.
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = _build_cache(path, cache_only)
+        _cache_configured = True
+    return _cache
+
+
+def get_cache() -> Optional[HttpCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                if os.environ.get("SCRAPER_HTTP_CACHE"):
+                    _cache = _build_cache(None, cache_only=False)
+                _cache_configured = True
+    return _cache
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if not raw:
+        return float(default)
+    try:
+        return float(raw)
+    except ValueError:
+        return float(default)
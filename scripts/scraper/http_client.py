@@ -0,0 +1,148 @@
+"""
+Shared HTTP clients for api.n8n.io requests.
+
+- get_session(): process-wide requests.Session with a keep-alive connection pool,
+  used by the synchronous fetchers (safe to share between worker threads).
+- create_async_client(): httpx.AsyncClient with a bounded keep-alive pool and HTTP/2
+  when the optional `h2` package is installed, used by the *_async fetchers.
+
+Pool size defaults to SCRAPER_MAX_CONNECTIONS (env, default 20).
+
+cached_get() / cached_get_async() route GET requests through the optional on-disk
+response cache (see http_cache.py) before touching the network.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CacheEntry, get_cache
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - only needed for the async fetchers
+    httpx = None  # type: ignore[assignment]
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - HTTP/2 is optional
+    HTTP2_AVAILABLE = False
+
+
+DEFAULT_HEADERS = {"Accept": "application/json", "User-Agent": "n8n-template-scraper/1.0"}
+DEFAULT_TIMEOUT = 60
+
+# Status returned for a cache miss in cache-only mode (as for `Cache-Control: only-if-cached`).
+CACHE_ONLY_MISS_STATUS = 504
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_max_connections() -> int:
+    raw = os.environ.get("SCRAPER_MAX_CONNECTIONS", "20")
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 20
+    return max(1, value)
+
+
+def get_session() -> requests.Session:
+    """Return the shared requests.Session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool = get_max_connections()
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def create_async_client(max_connections: int | None = None) -> "httpx.AsyncClient":
+    """
+    Create an httpx.AsyncClient sharing one keep-alive pool for all requests made through it.
+    Use as `async with create_async_client() as client: ...`.
+    """
+    if httpx is None:
+        raise RuntimeError("httpx is not installed; run `pip install -r requirements.txt` to use the async fetchers")
+    pool = max_connections or get_max_connections()
+    limits = httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+    return httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=DEFAULT_TIMEOUT,
+        limits=limits,
+        http2=HTTP2_AVAILABLE,
+    )
+
+
+class HttpStatusError(requests.HTTPError):
+    """Raised by fetchers for non-2xx responses (cached or live)."""
+
+
+def _full_url(url: str, params: Optional[dict]) -> str:
+    return f"{url}?{urlencode(params)}" if params else url
+
+
+def _conditional_headers(entry: Optional[CacheEntry]) -> dict:
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def cached_get(url: str, params: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT) -> Tuple[int, bytes]:
+    """
+    GET through the shared session and the response cache. Returns (status_code, body).
+    Fresh cache hits skip the network; stale hits are revalidated with ETag/Last-Modified.
+    """
+    full_url = _full_url(url, params)
+    cache = get_cache()
+    entry = cache.get(full_url) if cache is not None else None
+    if cache is not None:
+        if entry is not None and cache.is_fresh(entry):
+            return 200, entry.body
+        if cache.cache_only:
+            return CACHE_ONLY_MISS_STATUS, b""
+
+    resp = get_session().get(full_url, timeout=timeout, headers=_conditional_headers(entry))
+    if resp.status_code == 304 and entry is not None:
+        cache.touch(full_url)
+        return 200, entry.body
+    if resp.status_code == 200 and cache is not None:
+        cache.put(full_url, resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+    return resp.status_code, resp.content
+
+
+async def cached_get_async(client: "httpx.AsyncClient", url: str, params: Optional[dict] = None) -> Tuple[int, bytes]:
+    """Async variant of cached_get using a shared httpx.AsyncClient."""
+    full_url = _full_url(url, params)
+    cache = get_cache()
+    entry = cache.get(full_url) if cache is not None else None
+    if cache is not None:
+        if entry is not None and cache.is_fresh(entry):
+            return 200, entry.body
+        if cache.cache_only:
+            return CACHE_ONLY_MISS_STATUS, b""
+
+    resp = await client.get(full_url, headers=_conditional_headers(entry))
+    if resp.status_code == 304 and entry is not None:
+        cache.touch(full_url)
+        return 200, entry.body
+    if resp.status_code == 200 and cache is not None:
+        cache.put(full_url, resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+    return resp.status_code, resp.content
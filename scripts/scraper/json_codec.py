@@ -0,0 +1,69 @@
+"""
+JSON decoding used by every scraper load path (API responses, local template files, state).
+
+Picks the fastest installed backend: orjson, then msgspec, then the stdlib json module.
+Set SCRAPER_JSON_BACKEND=orjson|msgspec|json to force one. If a fast backend rejects input
+that the stdlib accepts (e.g. NaN or integers wider than 64 bits), decoding falls back to
+the stdlib, so results never depend on which backend is installed.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speedup
+    msgspec = None  # type: ignore[assignment]
+
+
+def _stdlib_loads(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+def available_backends() -> Dict[str, Callable[[Union[bytes, str]], Any]]:
+    """Installed decoders by name, fastest first."""
+    backends: Dict[str, Callable[[Union[bytes, str]], Any]] = {}
+    if orjson is not None:
+        backends["orjson"] = orjson.loads
+    if msgspec is not None:
+        backends["msgspec"] = msgspec.json.decode
+    backends["json"] = _stdlib_loads
+    return backends
+
+
+def _select_backend() -> str:
+    backends = available_backends()
+    requested = os.environ.get("SCRAPER_JSON_BACKEND", "").strip().lower()
+    if requested and requested in backends:
+        return requested
+    return next(iter(backends))
+
+
+BACKEND = _select_backend()
+_decode = available_backends()[BACKEND]
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode a JSON document from bytes or str. Raises ValueError on invalid JSON."""
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    try:
+        return _decode(data)
+    except ValueError:
+        if _decode is _stdlib_loads:
+            raise
+        return _stdlib_loads(data)
+
+
+def load_path(path: Union[str, Path]) -> Any:
+    """Read and decode a JSON file."""
+    with open(path, "rb") as f:
+        return loads(f.read())
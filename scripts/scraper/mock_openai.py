@@ -0,0 +1,230 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for exercising ai_categorizer offline.
+
+It answers POST /v1/chat/completions in the shape categorize_batch expects: the user message
+is the {"allowed_categories", "items"} payload, and the reply assigns each item a category
+(derive_category_from_tags_and_text, else a stable pick from allowed_categories).
+Failure modes are injected at configurable rates:
+  - 429 with Retry-After-Ms (rate limit)
+  - malformed content: prose-wrapped JSON, a truncated array, or a response missing ids
+GET /stats returns request counters as JSON.
+
+Usage:
+  python mock_openai.py [--port 8089] [--latency-ms 200] [--jitter-ms 100]
+                        [--rate-limit 0.05] [--malformed 0.05]
+  OPENAI_API_KEY=mock OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python enrich_metadata.py ...
+
+bench.py ai starts one in-process (see MockOpenAI).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from normalize import derive_category_from_tags_and_text
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 200.0
+    jitter_ms: float = 100.0
+    rate_limit: float = 0.0  # probability of a 429
+    retry_after_ms: int = 500
+    malformed: float = 0.0  # probability of a malformed / partial body
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    rate_limited: int = 0
+    malformed: int = 0
+    items: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "malformed": self.malformed,
+                "items": self.items,
+            }
+
+
+def _category_for(item: Dict[str, Any], allowed: List[str]) -> str:
+    derived = derive_category_from_tags_and_text(item.get("tags") or [], item.get("title") or "", item.get("description") or "")
+    if derived in allowed:
+        return derived
+    digest = hashlib.sha256(str(item.get("id")).encode("utf-8")).digest()
+    return allowed[digest[0] % len(allowed)] if allowed else "Other"
+
+
+def _malform(results: List[Dict[str, str]], rng: random.Random) -> str:
+    mode = rng.choice(("prose", "truncated", "missing"))
+    body = json.dumps(results)
+    if mode == "prose":
+        return f"Here are the categories:\n```json\n{body}\n```"
+    if mode == "truncated":
+        return body[: max(1, int(len(body) * 0.6))]
+    keep = results[: max(0, len(results) - max(1, len(results) // 4))]
+    return json.dumps({"results": keep})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - keep quiet
+        return
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.stats.as_dict())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:  # noqa: N802
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        cfg, stats = self.server.config, self.server.stats
+        with self.server.rng_lock:
+            delay = max(0.0, cfg.latency_ms + self.server.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000.0
+            throttle = self.server.rng.random() < cfg.rate_limit
+            malformed = self.server.rng.random() < cfg.malformed
+        time.sleep(delay)
+
+        with stats.lock:
+            stats.requests += 1
+            stats.rate_limited += throttle
+        if throttle:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(cfg.retry_after_ms), "x-ratelimit-remaining-requests": "0"},
+            )
+            return
+
+        user = next((m for m in reversed(request.get("messages") or []) if m.get("role") == "user"), {})
+        try:
+            payload = json.loads(user.get("content") or "{}")
+        except ValueError:
+            payload = {}
+        allowed = payload.get("allowed_categories") or []
+        items = payload.get("items") or []
+        results = [{"id": str(it.get("id")), "category": _category_for(it, allowed)} for it in items]
+
+        if malformed:
+            with self.server.rng_lock:
+                content = _malform(results, self.server.rng)
+        elif request.get("response_format"):
+            content = json.dumps({"results": results})
+        else:
+            content = json.dumps(results)
+        with stats.lock:
+            stats.items += len(items)
+            stats.malformed += malformed
+
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-mock-{stats.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model") or "mock",
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": len(user.get("content") or "") // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(user.get("content") or "") + len(content)) // 4},
+            },
+            {"x-ratelimit-remaining-requests": "1000"},
+        )
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, config: MockConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config = config
+        self.stats = MockStats()
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+
+
+class MockOpenAI:
+    """Mock server on a background thread; use as a context manager. base_url ends in /v1."""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._server = _Server((host, port), config or MockConfig())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self) -> MockStats:
+        return self._server.stats
+
+    def __enter__(self) -> "MockOpenAI":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve a mock OpenAI chat-completions endpoint.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="Probability of a 429 per request")
+    ap.add_argument("--retry-after-ms", type=int, default=500)
+    ap.add_argument("--malformed", type=float, default=0.0, help="Probability of a malformed / partial response")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+        retry_after_ms=args.retry_after_ms,
+        malformed=args.malformed,
+        seed=args.seed,
+    )
+    mock = MockOpenAI(config, host=args.host, port=args.port)
+    print(f"Mock OpenAI listening on {mock.base_url}")
+    with mock:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ Normalize n8n workflow JSON (from API or local file) into our schema shape.
 Extracts node types for faceted search and builds tags/category.
 """
 from collections import Counter
+import hashlib
+import json
 import re
 
 
@@ -22,7 +24,7 @@ def normalize_position(pos) -> dict:
 
 
 # Central mapping from tags/keywords to high-level categories.
-# Keys are normalized tokens (lowercase).
+# Keys are normalized tokens or multi-word phrases (lowercase, single spaces).
 CATEGORY_BY_TAG = {
     # Channels / communication
     "email": "Email & Communication",
@@ -30,6 +32,7 @@ CATEGORY_BY_TAG = {
     "smtp": "Email & Communication",
     "newsletter": "Email & Communication",
     "mailchimp": "Email & Communication",
+    "microsoft outlook": "Email & Communication",
     "slack": "Chat & Messaging",
     "telegram": "Chat & Messaging",
     "whatsapp": "Chat & Messaging",
@@ -61,6 +64,8 @@ CATEGORY_BY_TAG = {
     "hubspot": "CRM & Sales",
     "salesforce": "CRM & Sales",
     "pipedrive": "CRM & Sales",
+    "lead generation": "Sales & Outreach",
+    "cold email": "Sales & Outreach",
     "lead": "CRM & Sales",
     "leads": "CRM & Sales",
     "outreach": "Sales & Outreach",
@@ -73,6 +78,7 @@ CATEGORY_BY_TAG = {
     "content": "SEO & Content",
     "blog": "SEO & Content",
     "copy": "SEO & Content",
+    "customer support": "Support & Helpdesk",
     "support": "Support & Helpdesk",
     "ticket": "Support & Helpdesk",
     "tickets": "Support & Helpdesk",
@@ -110,6 +116,7 @@ CATEGORY_BY_TAG = {
     "ai": "AI & LLMs",
     "agent": "AI & LLMs",
     "rag": "RAG & Vector Search",
+    "vector store": "RAG & Vector Search",
     "vector": "RAG & Vector Search",
     "embeddings": "RAG & Vector Search",
     "summarize": "Summarization & Q&A",
@@ -130,8 +137,12 @@ CATEGORY_BY_TAG = {
     # Tools & ecosystem
     "google": "Google Workspace",
     "drive": "Google Workspace",
+    "google drive": "Google Workspace",
+    "google docs": "Google Workspace",
     "calendar": "Scheduling & Calendar",
+    "google calendar": "Scheduling & Calendar",
     "sheets": "Spreadsheets",
+    "google sheets": "Spreadsheets",
     "sheet": "Spreadsheets",
     "excel": "Spreadsheets",
     "spreadsheet": "Spreadsheets",
@@ -202,6 +213,22 @@ CATEGORY_PRIORITY = {
 }
 
 
+_WORD_RE = re.compile(r"[a-z0-9+]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens ([a-z0-9+] runs), as matched against CATEGORY_BY_TAG."""
+    return _WORD_RE.findall((text or "").lower())
+
+
+_KEYWORD_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+
+
+def keyword_tokens(text: str) -> list[str]:
+    """Lowercase alphanumeric runs, in order and with repeats (keyword tags, tag pages)."""
+    return [tok for tok in _KEYWORD_SPLIT_RE.split((text or "").lower()) if tok]
+
+
 def _normalize_token(token: str) -> str:
     """Normalize a raw tag/keyword into a lookup token."""
     t = (token or "").strip().lower()
@@ -217,9 +244,89 @@ def _normalize_token(token: str) -> str:
     return t
 
 
-def derive_category_from_tags_and_text(tags: list[str], title: str, description: str) -> str:
+class CategoryMatcher:
+    """
+    Finds CATEGORY_BY_TAG keys (single words and phrases) in free text.
+
+    Text is tokenized on [a-z0-9+] runs, as before, with one compiled regex and counted in C;
+    every distinct token is then a single dict lookup. Multi-word keys ("google sheets", "q&a")
+    are first rewritten into one joined token by a small regex per leading word, which only
+    runs when that word occurs in the text. A phrase hit replaces its words, so
+    "google sheets" counts as Spreadsheets rather than Google Workspace. Build once and reuse.
+    """
+
+    _TOKEN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789+")
+    _JOIN = "\x00"
+
+    def __init__(self, category_by_tag: dict[str, str]) -> None:
+        self._category_by_key: dict[str, str] = {}
+        phrases_by_first: dict[str, list[list[str]]] = {}
+        for key, cat in category_by_tag.items():
+            words = tokenize(key)
+            if not words:
+                continue
+            self._category_by_key[self._JOIN.join(words)] = cat
+            if len(words) > 1:
+                phrases_by_first.setdefault(words[0], []).append(words[1:])
+        # A literal leading word lets re skip ahead quickly; the left boundary is checked in _join.
+        self._phrase_patterns = [
+            (
+                first,
+                re.compile(
+                    re.escape(first)
+                    + r"[^a-z0-9+]+(?:"
+                    + "|".join(
+                        r"[^a-z0-9+]+".join(re.escape(w) for w in rest)
+                        for rest in sorted(rests, key=lambda r: len(" ".join(r)), reverse=True)
+                    )
+                    + r")(?![a-z0-9+])"
+                ),
+            )
+            for first, rests in phrases_by_first.items()
+        ]
+        self._token_re = re.compile(r"[a-z0-9+]+(?:\x00[a-z0-9+]+)*")
+
+    def _join(self, m: re.Match) -> str:
+        start = m.start()
+        if start and m.string[start - 1] in self._TOKEN_CHARS:
+            return m.group(0)
+        return self._JOIN.join(_WORD_RE.findall(m.group(0)))
+
+    def scores(self, text: str) -> dict[str, int]:
+        """Map each matched category to its number of hits, in order of first match."""
+        text = (text or "").lower()
+        for first, pattern in self._phrase_patterns:
+            if first in text:
+                text = pattern.sub(self._join, text)
+        found: dict[str, int] = {}
+        for token, hits in Counter(self._token_re.findall(text)).items():
+            cat = self._category_by_key.get(token)
+            if cat:
+                found[cat] = found.get(cat, 0) + hits
+        return found
+
+    def best(self, text: str) -> str:
+        """Highest-priority matched category ("" when nothing matches)."""
+        return _best_by_priority(self.scores(text))
+
+
+def _best_by_priority(categories) -> str:
+    # Strict ">" keeps the first category seen among equal priorities.
     best_category = ""
     best_priority = -1
+    for cat in categories:
+        prio = CATEGORY_PRIORITY.get(cat, 50)
+        if prio > best_priority:
+            best_category = cat
+            best_priority = prio
+    return best_category
+
+
+CATEGORY_MATCHER = CategoryMatcher(CATEGORY_BY_TAG)
+
+
+def derive_category_from_tags_and_text(tags: list[str], title: str, description: str) -> str:
+    matched: list[str] = []
 
     # 1) Try tags (already normalized strings)
     for raw in tags or []:
@@ -232,29 +339,28 @@ def derive_category_from_tags_and_text(tags: list[str], title: str, description:
         if not token:
             continue
         cat = CATEGORY_BY_TAG.get(token)
-        if not cat:
-            continue
-        prio = CATEGORY_PRIORITY.get(cat, 50)
-        if prio > best_priority:
-            best_category = cat
-            best_priority = prio
+        if cat:
+            matched.append(cat)
 
-    # 2) Try simple keyword tokens from title/description
-    text = f"{title or ''} {description or ''}".lower()
-    tokens = re.split(r"[^a-z0-9+]+", text)
-    for tok in tokens:
-        token = _normalize_token(tok)
-        if not token:
-            continue
-        cat = CATEGORY_BY_TAG.get(token)
-        if not cat:
-            continue
-        prio = CATEGORY_PRIORITY.get(cat, 50)
-        if prio > best_priority:
-            best_category = cat
-            best_priority = prio
+    # 2) Keywords and phrases from title/description
+    matched.extend(CATEGORY_MATCHER.scores(f"{title or ''} {description or ''}"))
 
-    return best_category
+    return _best_by_priority(matched)
+
+
+def content_fingerprint(title: str, description: str, raw_workflow: dict) -> str:
+    """
+    Stable SHA-256 of the fields we sync from upstream (title, description, raw workflow).
+    Keys are sorted so the hash does not depend on JSON key order.
+    """
+    payload = json.dumps(
+        {"title": title or "", "description": description or "", "raw_workflow": raw_workflow or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 def normalize_workflow(raw: dict, source_id: str, title: str, description: str = "", category: str = "", source_url: str = "", tags_override: list | None = None) -> dict:
@@ -293,6 +399,7 @@ def normalize_workflow(raw: dict, source_id: str, title: str, description: str =
         "raw_workflow": raw,
         "source_url": source_url,
         "node_type_counts": node_type_counts,
+        "content_hash": content_fingerprint(title, description or "", raw),
     }
 
 
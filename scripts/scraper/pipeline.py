@@ -0,0 +1,166 @@
+"""
+Small threaded producer/consumer pipeline used by run.py.
+
+Items flow through a list of stages (e.g. fetch -> normalize -> upload). Each stage has its
+own worker threads and reads from a bounded queue, so a slow stage applies back-pressure to
+the ones before it instead of letting work pile up in memory. A stage can also take items
+in batches (for bulk uploads).
+
+Results are yielded as (index, payload, error) in completion order; callers that need
+listing order (e.g. to save resume state) reorder by index.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+_SENTINEL = object()
+
+
+@dataclass
+class Stage:
+    """
+    name: label used in stats output.
+    fn: payload -> payload, or list[payload] -> list[payload] when batch_size > 1.
+        Raising marks the item(s) as failed; they skip the remaining stages.
+    workers: number of threads for this stage.
+    batch_size: max items per call when > 1.
+    max_wait: seconds a batching worker waits for a batch to fill before flushing.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    batch_size: int = 1
+    max_wait: float = 0.5
+
+
+@dataclass
+class StageStats:
+    name: str
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, count: int, errors: int, seconds: float) -> None:
+        with self._lock:
+            self.processed += count
+            self.errors += errors
+            self.busy_seconds += seconds
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], queue_size: int = 100) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stats = [StageStats(s.name) for s in stages]
+        self._started_at = 0.0
+
+    def run(self, items: Iterable[Any]) -> Iterator[Tuple[int, Any, Optional[BaseException]]]:
+        """Feed items through all stages; yield (index, payload, error) as items finish."""
+        queues: List[queue.Queue] = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        out: queue.Queue = queue.Queue()
+        remaining = [s.workers for s in self.stages]
+        remaining_lock = threading.Lock()
+        self._started_at = time.monotonic()
+
+        def forward(i: int, index: int, payload: Any) -> None:
+            if i + 1 < len(self.stages):
+                queues[i + 1].put((index, payload))
+            else:
+                out.put((index, payload, None))
+
+        def finish_worker(i: int) -> None:
+            # The last worker of a stage to exit closes the next stage (or the output).
+            with remaining_lock:
+                remaining[i] -= 1
+                last = remaining[i] == 0
+            if not last:
+                return
+            if i + 1 < len(self.stages):
+                for _ in range(self.stages[i + 1].workers):
+                    queues[i + 1].put(_SENTINEL)
+            else:
+                out.put(_SENTINEL)
+
+        def worker(i: int) -> None:
+            stage, stats, inbox = self.stages[i], self.stats[i], queues[i]
+            done = False
+            while not done:
+                first = inbox.get()
+                if first is _SENTINEL:
+                    break
+                batch = [first]
+                if stage.batch_size > 1:
+                    deadline = time.monotonic() + stage.max_wait
+                    while len(batch) < stage.batch_size:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        try:
+                            nxt = inbox.get(timeout=timeout)
+                        except queue.Empty:
+                            break
+                        if nxt is _SENTINEL:
+                            done = True
+                            break
+                        batch.append(nxt)
+
+                started = time.monotonic()
+                try:
+                    if stage.batch_size > 1:
+                        results = list(stage.fn([payload for _, payload in batch]))
+                        if len(results) != len(batch):
+                            raise RuntimeError(f"stage {stage.name} returned {len(results)} results for {len(batch)} items")
+                    else:
+                        results = [stage.fn(batch[0][1])]
+                except Exception as e:  # noqa: BLE001
+                    stats.record(len(batch), len(batch), time.monotonic() - started)
+                    for index, payload in batch:
+                        out.put((index, payload, e))
+                    continue
+                stats.record(len(batch), 0, time.monotonic() - started)
+                for (index, _), result in zip(batch, results):
+                    forward(i, index, result)
+            finish_worker(i)
+
+        def feeder() -> None:
+            for index, item in enumerate(items):
+                queues[0].put((index, item))
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_SENTINEL)
+
+        threads = [threading.Thread(target=feeder, name="pipeline-feeder", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=worker, args=(i,), name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+
+        while True:
+            entry = out.get()
+            if entry is _SENTINEL:
+                break
+            yield entry
+
+        for t in threads:
+            t.join()
+
+    def stats_summary(self) -> str:
+        """One-line per-stage throughput summary, e.g. 'fetch 12.1/s (busy 96%)'."""
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        parts = []
+        for stage, stats in zip(self.stages, self.stats):
+            rate = stats.processed / elapsed
+            busy = stats.busy_seconds / (elapsed * stage.workers) * 100
+            part = f"{stats.name} {stats.processed} @ {rate:.1f}/s (busy {busy:.0f}%)"
+            if stats.errors:
+                part += f" err={stats.errors}"
+            parts.append(part)
+        return ", ".join(parts)
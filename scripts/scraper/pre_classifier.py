@@ -0,0 +1,283 @@
+"""
+Offline pre-classifier for template categories.
+
+A multinomial naive Bayes model over three kinds of features: n8n node types (from
+extract_node_types), tags, and title tokens. It is trained from templates that already
+carry a specific category (API, keyword or AI labelled; never its own labels, see
+templates.category_source) and saved as a small JSON file. With --pre-classifier,
+enrich_metadata asks it first for rows that would otherwise go to the LLM and only sends
+the rows it is not confident about to ai_categorizer.categorize_batch.
+
+Naive Bayes posteriors are close to 1 for almost every row, so confidence is the margin
+between the two best classes (difference of their log scores) instead. The margin a label
+needs is calibrated at training time: a model trained on 4/5 of the examples labels the
+held-out fifth, and the threshold is the lowest margin at which those labels are still at
+least --target-precision correct. The saved model is then trained on every example.
+
+Usage:
+  python pre_classifier.py train [--model PATH] [--min-count N] [--target-precision P]
+
+Configuration:
+  PRE_CLASSIFIER_MODEL   model path (default scripts/scraper/.pre_classifier.json)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ai_categorizer import ALLOWED_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / ".pre_classifier.json"
+DEFAULT_TARGET_PRECISION = 0.95
+# Every HOLDOUT_EVERY-th example is held out for calibration.
+HOLDOUT_EVERY = 5
+# Fewer held-out predictions than this above a cut-off is too little to trust its precision.
+MIN_CALIBRATION_SUPPORT = 20
+MODEL_VERSION = 2
+# Values of templates.category_source (migration 20250224000001).
+SOURCE_PRE_CLASSIFIER = "pre_classifier"
+
+# Catch-all labels are what the pre-classifier is meant to replace, so they are never learned.
+UNINFORMATIVE_CATEGORIES = {"", "Automation & Orchestration", "Other"}
+
+# Node types present in almost every workflow carry no signal.
+IGNORED_NODE_TYPES = {
+    "n8n-nodes-base.stickyNote",
+    "n8n-nodes-base.set",
+    "n8n-nodes-base.if",
+    "n8n-nodes-base.code",
+    "n8n-nodes-base.noOp",
+    "n8n-nodes-base.merge",
+    "n8n-nodes-base.manualTrigger",
+}
+
+_TITLE_STOPWORDS = {
+    "the", "and", "for", "with", "from", "into", "using", "your", "this", "that", "via", "new", "get", "all",
+}
+
+
+def extract_features(title: str, tags: Iterable[Any], node_types: Iterable[str]) -> List[str]:
+    """Feature strings for one template: node:<type>, tag:<name>, word:<title token>."""
+    features: List[str] = []
+    for nt in node_types or []:
+        if nt and nt not in IGNORED_NODE_TYPES:
+            features.append(f"node:{nt}")
+    for raw in tags or []:
+        name = raw.get("name") if isinstance(raw, dict) else raw
+        name = (name or "").strip().lower() if isinstance(name, str) else ""
+        if name:
+            features.append(f"tag:{name}")
+    for tok in re.split(r"[^a-z0-9]+", (title or "").lower()):
+        if len(tok) >= 3 and tok not in _TITLE_STOPWORDS:
+            features.append(f"word:{tok}")
+    return list(dict.fromkeys(features))
+
+
+class PreClassifier:
+    """Naive Bayes over binary features with Laplace smoothing."""
+
+    def __init__(
+        self,
+        class_counts: Dict[str, int],
+        feature_counts: Dict[str, Dict[str, int]],
+        threshold: Optional[float] = None,
+        calibration: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.class_counts = class_counts
+        self.feature_counts = feature_counts
+        # Minimum margin for a label to be used; None labels nothing (see calibrate).
+        self.threshold = threshold
+        self.calibration = calibration or {}
+        total = sum(class_counts.values()) or 1
+        vocab = {f for counts in feature_counts.values() for f in counts}
+        self._vocab_size = len(vocab) or 1
+        self._log_prior = {c: math.log(n / total) for c, n in class_counts.items()}
+        self._class_totals = {c: sum(feature_counts.get(c, {}).values()) for c in class_counts}
+        self._vocab = vocab
+
+    @classmethod
+    def train(cls, examples: Iterable[Tuple[List[str], str]], min_count: int = 2) -> "PreClassifier":
+        """examples: (features, category). Features seen fewer than min_count times are dropped."""
+        class_counts: Counter = Counter()
+        per_class: Dict[str, Counter] = defaultdict(Counter)
+        seen: Counter = Counter()
+        rows = []
+        for features, category in examples:
+            if category in UNINFORMATIVE_CATEGORIES or category not in ALLOWED_CATEGORIES or not features:
+                continue
+            rows.append((features, category))
+            seen.update(features)
+        for features, category in rows:
+            class_counts[category] += 1
+            per_class[category].update(f for f in features if seen[f] >= min_count)
+        return cls(dict(class_counts), {c: dict(counts) for c, counts in per_class.items()})
+
+    @classmethod
+    def train_calibrated(
+        cls,
+        examples: Iterable[Tuple[List[str], str]],
+        min_count: int = 2,
+        target_precision: float = DEFAULT_TARGET_PRECISION,
+    ) -> "PreClassifier":
+        """Train on every example, with the threshold calibrated on a held-out fifth (see calibrate)."""
+        examples = list(examples)
+        held_out = examples[::HOLDOUT_EVERY]
+        training = [ex for i, ex in enumerate(examples) if i % HOLDOUT_EVERY]
+        threshold, calibration = calibrate(cls.train(training, min_count), held_out, target_precision)
+        model = cls.train(examples, min_count)
+        model.threshold = threshold
+        model.calibration = calibration
+        return model
+
+    def confident(self, features: List[str], threshold: Optional[float] = None) -> str:
+        """The predicted category when its margin reaches `threshold` (default: the calibrated one), else ""."""
+        threshold = self.threshold if threshold is None else threshold
+        if threshold is None:
+            return ""
+        category, margin = self.predict(features)
+        return category if margin >= threshold else ""
+
+    def predict(self, features: List[str]) -> Tuple[str, float]:
+        """
+        Return (category, margin): the log-score difference between the best and the second
+        best class (inf with a single class); ("", 0.0) when nothing is known.
+        """
+        known = [f for f in features if f in self._vocab]
+        if not known or not self.class_counts:
+            return "", 0.0
+        scores: Dict[str, float] = {}
+        for category, log_prior in self._log_prior.items():
+            counts = self.feature_counts.get(category, {})
+            denom = self._class_totals[category] + self._vocab_size
+            scores[category] = log_prior + sum(math.log((counts.get(f, 0) + 1) / denom) for f in known)
+        ranked = sorted(scores.values(), reverse=True)
+        best = max(scores, key=scores.__getitem__)
+        return best, (ranked[0] - ranked[1]) if len(ranked) > 1 else math.inf
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": MODEL_VERSION,
+            "threshold": self.threshold,
+            "calibration": self.calibration,
+            "class_counts": self.class_counts,
+            "feature_counts": self.feature_counts,
+        }
+
+    def save(self, path: Path | str) -> None:
+        Path(path).write_text(json.dumps(self.to_dict(), separators=(",", ":")), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path | str) -> Optional["PreClassifier"]:
+        """Load a saved model; None when the file is missing or from another MODEL_VERSION."""
+        p = Path(path)
+        if not p.is_file():
+            return None
+        data = json.loads(p.read_text(encoding="utf-8"))
+        if data.get("version") != MODEL_VERSION:
+            logger.warning("Ignoring pre-classifier model %s (version %s)", p, data.get("version"))
+            return None
+        return cls(data["class_counts"], data["feature_counts"], data.get("threshold"), data.get("calibration"))
+
+
+def calibrate(
+    model: PreClassifier, held_out: Iterable[Tuple[List[str], str]], target_precision: float = DEFAULT_TARGET_PRECISION
+) -> Tuple[Optional[float], Dict[str, Any]]:
+    """
+    Lowest margin at which `model`'s labels for `held_out` are at least `target_precision`
+    correct, with at least MIN_CALIBRATION_SUPPORT labels at or above it. Returns
+    (threshold, stats); the threshold is None when no cut-off qualifies.
+    """
+    predictions = []
+    for features, category in held_out:
+        if category in UNINFORMATIVE_CATEGORIES or category not in ALLOWED_CATEGORIES or not features:
+            continue
+        predicted, margin = model.predict(features)
+        if predicted:
+            predictions.append((margin, predicted == category))
+    predictions.sort(key=lambda p: p[0], reverse=True)
+    stats: Dict[str, Any] = {"held_out": len(predictions), "target_precision": target_precision}
+    threshold = None
+    correct = 0
+    for i, (margin, ok) in enumerate(predictions):
+        correct += ok
+        labelled = i + 1
+        # Only cut between distinct margins: every prediction tied at `margin` is labelled too.
+        if labelled < len(predictions) and predictions[labelled][0] == margin:
+            continue
+        if labelled >= MIN_CALIBRATION_SUPPORT and correct / labelled >= target_precision:
+            threshold = margin
+            stats.update(precision=round(correct / labelled, 4), coverage=round(labelled / len(predictions), 4))
+    return threshold, stats
+
+
+def model_path(path: Path | str | None = None) -> Path:
+    return Path(path or os.environ.get("PRE_CLASSIFIER_MODEL") or DEFAULT_MODEL_PATH)
+
+
+def load_training_examples(client) -> List[Tuple[List[str], str]]:
+    """
+    Read labelled templates plus their node types from Supabase. Rows the pre-classifier
+    labelled itself (category_source = 'pre_classifier') are left out.
+    """
+    from upload_to_supabase import scan_table
+
+    columns = "id,title,tags,category"
+    try:
+        client.table("templates").select("category_source").limit(1).execute()
+        columns += ",category_source"
+    except Exception as e:  # noqa: BLE001
+        logger.warning("templates.category_source not available (%s); cannot tell pre-classifier labels apart", e)
+    node_types: Dict[str, List[str]] = defaultdict(list)
+    for row in scan_table(client, "node_types", "template_id,node_type"):
+        node_types[str(row["template_id"])].append(row["node_type"])
+    examples = []
+    own_labels = 0
+    for row in scan_table(client, "templates", columns):
+        category = row.get("category") or ""
+        if category in UNINFORMATIVE_CATEGORIES:
+            continue
+        if row.get("category_source") == SOURCE_PRE_CLASSIFIER:
+            own_labels += 1
+            continue
+        features = extract_features(row.get("title") or "", row.get("tags") or [], node_types.get(str(row["id"]), []))
+        examples.append((features, category))
+    if own_labels:
+        logger.info("Skipped %s templates labelled by the pre-classifier", own_labels)
+    return examples
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    ap = argparse.ArgumentParser(description="Train the offline category pre-classifier from Supabase templates.")
+    ap.add_argument("command", choices=["train"])
+    ap.add_argument("--model", default=None, help="Model path (default: PRE_CLASSIFIER_MODEL or scripts/scraper/.pre_classifier.json)")
+    ap.add_argument("--min-count", type=int, default=2, help="Drop features seen in fewer templates than this")
+    ap.add_argument("--target-precision", type=float, default=DEFAULT_TARGET_PRECISION,
+                    help="Held-out precision the calibrated threshold must reach")
+    args = ap.parse_args()
+
+    from upload_to_supabase import get_client
+
+    examples = load_training_examples(get_client())
+    model = PreClassifier.train_calibrated(examples, min_count=args.min_count, target_precision=args.target_precision)
+    path = model_path(args.model)
+    model.save(path)
+    logger.info("Trained on %s templates across %s categories; saved %s", sum(model.class_counts.values()), len(model.class_counts), path)
+    if model.threshold is None:
+        logger.warning("No margin reaches %.0f%% held-out precision (%s); the model will label nothing",
+                       args.target_precision * 100, model.calibration)
+    else:
+        logger.info("Calibrated margin threshold %.2f: %s", model.threshold, model.calibration)
+
+
+if __name__ == "__main__":
+    main()
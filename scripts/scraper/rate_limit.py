@@ -0,0 +1,116 @@
+"""
+Rate limiting helpers shared by the scraper scripts.
+
+TokenBucket enforces a global requests-per-second budget across threads, so
+concurrent workers together never exceed the rate the upstream API tolerates.
+AdaptiveConcurrency bounds the number of in-flight requests and adapts that bound
+from rate-limit responses (AIMD).
+"""
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    rate: tokens added per second (i.e. sustained requests/second).
+    burst: maximum number of tokens that can accumulate (default: one second's worth, at least 1).
+    A rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then consume them."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit shared by threads calling a rate-limited API.
+
+    Callers hold a slot (`with limiter.slot():`) for each request. The number of slots grows
+    by roughly one per `limit` successful requests (additive increase) and halves on a
+    throttled response (multiplicative decrease, at most once per `cooldown` seconds so a
+    burst of 429s from the same wave counts once). A throttle can also pause every caller
+    for the server's Retry-After.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, cooldown: float = 1.0) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def slot(self) -> "_Slot":
+        return _Slot(self)
+
+    def record_success(self) -> None:
+        with self._cond:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def record_throttle(self, retry_after: float | None = None) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self.throttled += 1
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+            if retry_after and retry_after > 0:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class _Slot:
+    def __init__(self, limiter: AdaptiveConcurrency) -> None:
+        self._limiter = limiter
+
+    def __enter__(self) -> AdaptiveConcurrency:
+        self._limiter.acquire()
+        return self._limiter
+
+    def __exit__(self, *exc: object) -> None:
+        self._limiter.release()
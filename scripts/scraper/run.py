@@ -3,6 +3,29 @@ Run the full pipeline: fetch listing from api.n8n.io -> fetch each workflow -> n
 
 Usage (non-interactive / CI):
   python run.py [--limit N] [--skip N] [--batch-size N] [--delay SECONDS] [--no-resume]
+                [--concurrency N] [--rate REQUESTS_PER_SECOND] [--refresh-changed]
+                [--delta] [--full-sweep-days N] [--normalize-workers N] [--upload-workers N]
+                [--http-cache [PATH]] [--cache-only]
+
+Each batch is uploaded with one bulk upsert. With --concurrency > 1, templates stream
+through a staged pipeline (fetch -> normalize -> upload) with bounded queues between
+stages: --concurrency fetch threads, --normalize-workers and --upload-workers threads.
+The per-item --delay is replaced by a global token-bucket limiter (--rate requests/second,
+default 1/delay) shared by all fetch workers. Results are reassembled in listing order,
+so batch summaries and the saved resume state are the same as in serial mode.
+
+By default templates already in Supabase are skipped. With --refresh-changed they are
+fetched again and only uploaded when their content hash (title, description, raw
+workflow) differs from the stored templates.content_hash, so unchanged rows cost no writes.
+
+With --delta, the listing fields of every synced template are remembered locally
+(.listing_snapshot.json) and only templates that are new or whose listing name/description
+changed are fetched. --full-sweep-days N forces a full pass when the last one is older
+than N days. Delta runs do not use or update the resume state.
+
+--http-cache keeps api.n8n.io responses in a local SQLite cache (see http_cache.py), so
+reruns after a crash don't refetch them; --cache-only serves from that cache without any
+network access.
 
 Default interactive mode (when stdin is a TTY) will prompt for:
   - batch size
@@ -17,13 +40,23 @@ import os
 import sys
 import time
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional
 
 from fetch_listing import fetch_all_listings
 from fetch_detail import fetch_workflow
 from normalize import normalize_from_api_payload
-from upload_to_supabase import get_client, upload_template
-from state import load_state, save_state
+from upload_to_supabase import get_client, scan_table, upload_templates_bulk
+from state import (
+    ListingSnapshot,
+    listing_fingerprint,
+    load_listing_snapshot,
+    load_state,
+    save_listing_snapshot,
+    save_state,
+)
+from rate_limit import TokenBucket
+from pipeline import Pipeline, Stage
+from http_cache import configure_cache, get_cache
 
 
 def _prompt_int(prompt: str, default: int) -> int:
@@ -110,6 +143,76 @@ def _report_admin_progress(
         pass
 
 
+def _full_sweep_due(snapshot: Optional[ListingSnapshot], full_sweep_days: int) -> bool:
+    """A delta run becomes a full sweep when there is no snapshot or the last sweep is too old."""
+    if snapshot is None or not snapshot.entries:
+        return True
+    if full_sweep_days <= 0:
+        return False
+    try:
+        last = datetime.fromisoformat(snapshot.last_full_sweep_utc)
+    except ValueError:
+        return True
+    return (datetime.now(timezone.utc) - last).days >= full_sweep_days
+
+
+def _fetch(work: Dict[str, Any], limiter: Optional[TokenBucket] = None) -> Dict[str, Any]:
+    """Fetch stage: download the raw workflow for one listing item."""
+    if work["status"]:
+        return work
+    if limiter is not None:
+        limiter.acquire()
+    work["raw"] = fetch_workflow(work["item"]["id"])
+    if not work["raw"]:
+        work["status"] = "err"
+    return work
+
+
+def _normalize(work: Dict[str, Any], existing_hashes: Dict[str, str]) -> Dict[str, Any]:
+    """Normalize stage: build the template row and mark it unchanged if its hash matches Supabase."""
+    if work["status"]:
+        return work
+    item = work["item"]
+    api_shape = {
+        "workflow": {
+            "workflow": work.pop("raw"),
+            "name": item.get("name"),
+            "description": item.get("description", ""),
+            "workflowInfo": {"categories": []},
+        }
+    }
+    norm = normalize_from_api_payload(api_shape, item["id"])
+    if not norm:
+        work["status"] = "err"
+    elif existing_hashes.get(norm["source_id"]) == norm["content_hash"]:
+        work["status"] = "unchanged"
+    work["norm"] = norm
+    return work
+
+
+def _upload(
+    works: List[Dict[str, Any]], client: Any, existing_hashes: Dict[str, str], refresh: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Upload stage: one bulk upsert for every template in `works` that still needs a write.
+    On refreshes, content_hash is written and existing rows keep their enriched category and tags.
+    """
+    pending = [w for w in works if not w["status"]]
+    if client is None:
+        for w in pending:
+            w["status"] = "ok"
+        return works
+    uploaded = upload_templates_bulk(client, [w["norm"] for w in pending], existing=existing_hashes if refresh else None)
+    for w in pending:
+        source_id = w["norm"]["source_id"]
+        if source_id in uploaded:
+            w["status"] = "ok"
+            existing_hashes[source_id] = w["norm"]["content_hash"]
+        else:
+            w["status"] = "err"
+    return works
+
+
 def main() -> None:
     admin_run_id = os.environ.get("ADMIN_RUN_ID") or None
     ap = argparse.ArgumentParser()
@@ -119,8 +222,21 @@ def main() -> None:
     ap.add_argument("--delay", type=float, default=0.0, help="Delay between items in seconds (0 = prompt/default)")
     ap.add_argument("--no-resume", action="store_true", help="Ignore any saved state and start from scratch")
     ap.add_argument("--dry-run", action="store_true", help="Fetch and normalize only; do not upload to Supabase")
+    ap.add_argument("--concurrency", type=int, default=1, help="Fetch threads; > 1 enables the staged pipeline (1 = serial)")
+    ap.add_argument("--normalize-workers", type=int, default=2, help="Normalize threads in pipeline mode")
+    ap.add_argument("--upload-workers", type=int, default=2, help="Upload threads in pipeline mode (each uploads --batch-size templates at a time)")
+    ap.add_argument("--refresh-changed", action="store_true", help="Refetch existing templates and upload only those whose content hash changed")
+    ap.add_argument("--delta", action="store_true", help="Only fetch templates that are new or whose listing fields changed since the last run")
+    ap.add_argument("--full-sweep-days", type=int, default=0, help="In --delta mode, do a full pass if the last one is older than N days (0 = never)")
+    ap.add_argument("--http-cache", nargs="?", const="", default=None, metavar="PATH",
+                    help="Cache api.n8n.io responses on disk (default path: scripts/scraper/.http_cache.sqlite)")
+    ap.add_argument("--cache-only", action="store_true", help="Serve api.n8n.io responses from the cache only; no network")
+    ap.add_argument("--rate", type=float, default=0.0, help="Max detail requests per second in concurrent mode (0 = 1/delay)")
     args = ap.parse_args()
 
+    if args.http_cache is not None or args.cache_only:
+        configure_cache(args.http_cache or None, cache_only=args.cache_only)
+
     interactive = sys.stdin.isatty()
 
     # Defaults
@@ -130,6 +246,8 @@ def main() -> None:
     batch_size = args.batch_size or (default_batch_size if not interactive else _prompt_int("Templates per batch (state saved after each)", default_batch_size))
     delay = args.delay or (default_delay if not interactive else _prompt_float("Delay between requests (seconds)", default_delay))
 
+    concurrency = max(1, args.concurrency)
+
     limit = args.limit
     if interactive and not args.limit:
         limit = _prompt_int("Max templates to sync (0 = all)", 0)
@@ -138,11 +256,26 @@ def main() -> None:
     listings: List[Dict[str, Any]] = fetch_all_listings()
     print(f"Found {len(listings)} templates")
 
-    # Load existing state (if any)
-    state = None if args.no_resume else load_state()
+    # Delta mode: narrow the listing to new/changed templates using the local snapshot.
+    snapshot: Optional[ListingSnapshot] = None
+    full_sweep = False
+    if args.delta:
+        snapshot = load_listing_snapshot()
+        full_sweep = _full_sweep_due(snapshot, args.full_sweep_days)
+        if snapshot is None:
+            snapshot = ListingSnapshot(last_full_sweep_utc="")
+        if full_sweep:
+            print(f"Delta mode: full sweep (last full sweep: {snapshot.last_full_sweep_utc or 'never'})")
+        else:
+            listings = [item for item in listings if snapshot.entries.get(str(item["id"])) != listing_fingerprint(item)]
+            print(f"Delta mode: {len(listings)} new or changed templates since last run")
+
+    # Load existing state (if any). Delta runs track progress in the listing snapshot instead.
+    state = None if (args.no_resume or args.delta) else load_state()
     start_index = 0
     total_ok = 0
     total_err = 0
+    total_unchanged = 0
 
     if state:
         # Find index of last_source_id in current listing
@@ -179,24 +312,18 @@ def main() -> None:
 
     client = None if args.dry_run else get_client()
 
-    # Preload existing source_ids so we can skip templates that are already in Supabase.
-    existing_source_ids: Set[str] = set()
+    # Preload existing source_ids (and their content hashes) so we can skip templates
+    # that are already in Supabase, or that are unchanged in --refresh-changed mode.
+    existing_hashes: Dict[str, str] = {}
+    refresh = args.refresh_changed or args.delta
     if client is not None:
-        page_size = 1000
-        offset = 0
-        while True:
-            resp = client.table("templates").select("source_id").range(offset, offset + page_size - 1).execute()
-            rows = resp.data or []
-            if not rows:
-                break
-            for row in rows:
-                sid = row.get("source_id")
-                if sid:
-                    existing_source_ids.add(str(sid))
-            if len(rows) < page_size:
-                break
-            offset += page_size
-        print(f"Loaded {len(existing_source_ids)} existing templates from Supabase (by source_id) for skipping.")
+        columns = "source_id,content_hash" if refresh else "source_id"
+        for row in scan_table(client, "templates", columns, key="source_id"):
+            sid = row.get("source_id")
+            if sid:
+                existing_hashes[str(sid)] = row.get("content_hash") or ""
+        action = "change detection" if refresh else "skipping"
+        print(f"Loaded {len(existing_hashes)} existing templates from Supabase (by source_id) for {action}.")
 
     total_count = len(listings)
     print(f"Processing {total_count} templates in batches of {batch_size} (dry_run={args.dry_run})")
@@ -204,62 +331,129 @@ def main() -> None:
     if admin_run_id:
         _report_admin_progress(admin_run_id, 0, 0, total_count)
 
-    for batch_start in range(0, total_count, batch_size):
-        batch = listings[batch_start : batch_start + batch_size]
+    # If a template already exists in Supabase, skip it and move on (unless refreshing).
+    skip_existing = client is not None and not refresh
+    works = [
+        {"item": item, "norm": None, "status": "skip" if skip_existing and str(item["id"]) in existing_hashes else None}
+        for item in listings
+    ]
+
+    def finish_batch(batch_start: int, stats: str = "") -> None:
+        nonlocal total_ok, total_err, total_unchanged
+        batch = works[batch_start : batch_start + batch_size]
         batch_ok = 0
         batch_err = 0
+        batch_unchanged = 0
         last_success_id = None
 
-        for item in batch:
-            tid = item["id"]
-            # If this template already exists in Supabase, skip it and move on.
-            if client is not None and str(tid) in existing_source_ids:
+        # Works are in listing order, so the last success is the right resume point.
+        for work in batch:
+            status = work["status"]
+            if status == "skip":
                 continue
-            try:
-                raw = fetch_workflow(tid)
-                if not raw:
-                    batch_err += 1
-                    total_err += 1
-                    continue
-                api_shape = {
-                    "workflow": {
-                        "workflow": raw,
-                        "name": item.get("name"),
-                        "description": item.get("description", ""),
-                        "workflowInfo": {"categories": []},
-                    }
-                }
-                norm = normalize_from_api_payload(api_shape, tid)
-                if not norm:
-                    batch_err += 1
-                    total_err += 1
-                    continue
-                if not args.dry_run and client is not None:
-                    upload_template(client, norm)
+            if status == "unchanged":
+                batch_unchanged += 1
+                total_unchanged += 1
+            elif status == "ok":
                 batch_ok += 1
                 total_ok += 1
-                last_success_id = norm["source_id"]
-            except Exception as e:  # noqa: BLE001
+            else:
                 batch_err += 1
                 total_err += 1
-                print(f"  Error template {tid}: {e}")
-            if delay > 0:
-                time.sleep(delay)
+                continue
+            last_success_id = work["norm"]["source_id"]
+            if snapshot is not None:
+                # Failed templates are not recorded, so the next delta run retries them.
+                snapshot.entries[str(work["item"]["id"])] = listing_fingerprint(work["item"])
+            # Drop the normalized payload once counted; only ids are needed from here on.
+            work["norm"] = {"source_id": last_success_id}
 
         batch_end_index = min(batch_start + batch_size, total_count)
         print(
-            f"Batch {batch_start + 1}-{batch_end_index}/{total_count} done: ok={batch_ok} err={batch_err} (total ok={total_ok} err={total_err})"
+            f"Batch {batch_start + 1}-{batch_end_index}/{total_count} done: ok={batch_ok} unchanged={batch_unchanged} err={batch_err} "
+            f"(total ok={total_ok} unchanged={total_unchanged} err={total_err})"
         )
+        if stats:
+            print(f"  Stages: {stats}")
 
         # Report progress for admin UI
         if admin_run_id:
             _report_admin_progress(admin_run_id, total_ok, total_err, total_count)
 
         # Persist state after each batch so we can resume if interrupted
-        if last_success_id is not None:
+        if snapshot is not None:
+            if not args.dry_run:
+                save_listing_snapshot(snapshot)
+        elif last_success_id is not None:
             save_state(last_success_id, total_ok, total_err)
 
-    print(f"Done. ok={total_ok} err={total_err}")
+    if concurrency > 1:
+        rate = args.rate or (1.0 / delay if delay > 0 else 0.0)
+        limiter = TokenBucket(rate)
+        pipeline = Pipeline(
+            [
+                Stage("fetch", lambda w: _fetch(w, limiter), workers=concurrency),
+                Stage("normalize", lambda w: _normalize(w, existing_hashes), workers=max(1, args.normalize_workers)),
+                Stage(
+                    "upload",
+                    lambda ws: _upload(ws, client, existing_hashes, refresh),
+                    workers=max(1, args.upload_workers),
+                    batch_size=batch_size,
+                ),
+            ],
+            queue_size=max(batch_size, concurrency * 2),
+        )
+        rate_label = f"rate limit {rate:g} req/s" if rate > 0 else "no rate limit"
+        print(
+            f"Pipeline mode: fetch={concurrency} normalize={args.normalize_workers} upload={args.upload_workers} workers, {rate_label}"
+        )
+
+        # Items finish out of order; advance a cursor over the listing and close each batch
+        # once every item in it is done.
+        done = [False] * total_count
+        cursor = 0
+        next_batch_start = 0
+        for index, work, error in pipeline.run(works):
+            if error is not None:
+                work["status"] = "err"
+                print(f"  Error template {work['item']['id']}: {error}")
+            done[index] = True
+            while cursor < total_count and done[cursor]:
+                cursor += 1
+            while next_batch_start < total_count and cursor >= min(next_batch_start + batch_size, total_count):
+                finish_batch(next_batch_start, pipeline.stats_summary())
+                next_batch_start += batch_size
+    else:
+        for batch_start in range(0, total_count, batch_size):
+            batch = works[batch_start : batch_start + batch_size]
+            for work in batch:
+                if work["status"]:
+                    continue
+                try:
+                    _normalize(_fetch(work), existing_hashes)
+                except Exception as e:  # noqa: BLE001
+                    work["status"] = "err"
+                    print(f"  Error template {work['item']['id']}: {e}")
+                if delay > 0:
+                    time.sleep(delay)
+            # One bulk upsert per batch instead of three requests per template.
+            try:
+                _upload(batch, client, existing_hashes, refresh)
+            except Exception as e:  # noqa: BLE001
+                print(f"  Error uploading batch: {e}")
+                for work in batch:
+                    if not work["status"]:
+                        work["status"] = "err"
+            finish_batch(batch_start)
+
+    if snapshot is not None and full_sweep and not args.dry_run:
+        snapshot.last_full_sweep_utc = datetime.now(timezone.utc).isoformat()
+        save_listing_snapshot(snapshot)
+
+    print(f"Done. ok={total_ok} unchanged={total_unchanged} err={total_err}")
+    cache = get_cache()
+    if cache is not None:
+        print(cache.stats_summary())
     if admin_run_id:
         _report_admin_run(admin_run_id, total_ok, total_err, "completed")
 
@@ -1,64 +1,106 @@
 """
 Load templates from local JSON files (n8n-workflow-all-templates/**/*.json) and upload to Supabase.
 Run from repo root or scripts/scraper. Expects REPO_ROOT or finds it relative to this file.
+
+Usage:
+  python run_local.py [--limit N] [--skip N] [--batch-size N] [--workers N] [--templates-dir PATH]
+                      [--snapshot [DIR]] [--dry-run]
+
+With --workers > 1, files are parsed and normalized in a process pool. Results stream back
+in file order (in chunks) and are fed to the bulk uploader as they arrive.
+With --snapshot, templates come from a corpus_snapshot.py build instead of the JSON tree:
+metadata is read from SQLite and each raw workflow is decoded from the memory-mapped blob.
 """
-import json
-import sys
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-# repo root: parent of scripts/
-REPO_ROOT = Path(__file__).resolve().parent.parent
-TEMPLATES_DIR = REPO_ROOT / "n8n-workflow-all-templates" / "n8n-workflow-all-templates"
+from corpus_snapshot import TEMPLATES_DIR, iter_jsons, load_and_normalize, normalize_local_data  # noqa: F401 - re-exported
+from upload_to_supabase import get_client, upload_templates_bulk
 
-from normalize import normalize_from_local_json
-from upload_to_supabase import get_client, upload_template
 
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=0, help="Max files to process (0 = all)")
+    ap.add_argument("--skip", type=int, default=0, help="Skip first N files")
+    ap.add_argument("--batch-size", type=int, default=100, help="Templates per bulk upsert")
+    ap.add_argument("--workers", type=int, default=1, help="Processes for parsing/normalizing (0 = CPU count, 1 = serial)")
+    ap.add_argument("--templates-dir", type=Path, default=TEMPLATES_DIR, help="Root directory of the local template JSON files")
+    ap.add_argument("--snapshot", nargs="?", const="", default=None, metavar="DIR",
+                    help="Read templates from a corpus snapshot (default dir: scripts/scraper/.corpus)")
+    ap.add_argument("--dry-run", action="store_true", help="Parse and normalize only; do not upload to Supabase")
+    args = ap.parse_args()
+
+    snapshot = None
+    if args.snapshot is not None:
+        from corpus_snapshot import SNAPSHOT_DIR, CorpusSnapshot
 
-def iter_jsons():
-    if not TEMPLATES_DIR.exists():
-        print("Templates dir not found:", TEMPLATES_DIR)
-        return
-    for path in TEMPLATES_DIR.rglob("*.json"):
-        yield path
+        snapshot_dir = Path(args.snapshot) if args.snapshot else SNAPSHOT_DIR
+        snapshot = CorpusSnapshot.open(snapshot_dir)
+        if snapshot is None:
+            print(f"No corpus snapshot in {snapshot_dir}; run: python corpus_snapshot.py build")
+            return
+        paths = list(snapshot.rows())
+        print(f"Found {len(paths)} templates in snapshot {snapshot_dir}")
+    else:
+        paths = list(iter_jsons(args.templates_dir))
+        print(f"Found {len(paths)} JSON files")
+    if args.skip:
+        paths = paths[args.skip:]
+    if args.limit:
+        paths = paths[:args.limit]
+    batch_size = max(1, args.batch_size)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    client = None if args.dry_run else get_client()
+    ok, err = 0, 0
+    pending = []
 
+    def flush():
+        nonlocal ok, err
+        if not pending:
+            return
+        if client is None:
+            ok += len(pending)
+            pending.clear()
+            return
+        uploaded = upload_templates_bulk(client, pending)
+        written = sum(1 for norm in pending if norm["source_id"] in uploaded)
+        ok += written
+        err += len(pending) - written
+        pending.clear()
 
-def main():
-    limit = 0
-    skip = 0
-    argv = sys.argv[1:]
-    for i, arg in enumerate(argv):
-        if arg == "--limit" and i + 1 < len(argv):
-            limit = int(argv[i + 1])
-        elif arg == "--skip" and i + 1 < len(argv):
-            skip = int(argv[i + 1])
+    executor = None
+    if snapshot is not None:
+        results = ((row["path"], snapshot.normalized(row), None) for row in paths)
+    elif workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # map() yields results in input order; chunks amortize inter-process overhead.
+        chunksize = max(1, min(64, len(paths) // (workers * 4) or 1))
+        results = executor.map(load_and_normalize, paths, chunksize=chunksize)
+        print(f"Parsing with {workers} worker processes (chunksize={chunksize})")
+    else:
+        results = map(load_and_normalize, paths)
 
-    paths = list(iter_jsons())
-    print(f"Found {len(paths)} JSON files")
-    if skip:
-        paths = paths[skip:]
-    if limit:
-        paths = paths[:limit]
-    client = get_client()
-    ok, err = 0, 0
-    for i, path in enumerate(paths):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if not data.get("nodes"):
+    try:
+        for i, (path, norm, error) in enumerate(results):
+            if error:
+                err += 1
+                print(f"  Error {path}: {error}")
+            elif norm is None:
                 err += 1
-                continue
-            source_id = data.get("meta", {}).get("id") or path.stem
-            if isinstance(source_id, int):
-                source_id = str(source_id)
-            source_url = data.get("meta", {}).get("site", "")
-            norm = normalize_from_local_json(data, source_id=source_id, source_url=source_url)
-            upload_template(client, norm)
-            ok += 1
+            else:
+                pending.append(norm)
+                if len(pending) >= batch_size:
+                    flush()
             if (i + 1) % 100 == 0:
                 print(f"  {i + 1}/{len(paths)} ok={ok} err={err}")
-        except Exception as e:
-            err += 1
-            print(f"  Error {path}: {e}")
+        flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if snapshot is not None:
+            snapshot.close()
     print(f"Done. ok={ok} err={err}")
 
 
@@ -0,0 +1,311 @@
+"""
+Offline full-text search over the local template corpus.
+
+The index is built from normalized templates (corpus_snapshot.load_rows) with the same
+tokenizer as derive_category_from_tags_and_text (normalize.tokenize). Title, tags,
+description and node names are indexed as one bag of words with per-field weights, and
+results are ranked with BM25. Postings are stored as compact arrays: uint32 template
+ordinals plus float32 BM25 impacts (idf and length normalization applied at build time),
+so a query is only a sum of impacts per template.
+
+On disk the index is one file: a short magic, a JSON header (vocabulary with posting
+offsets, document lengths, and per-template fields used for display and filters), then
+the raw posting arrays. Loading decodes only the header; posting arrays are sliced out
+of the file buffer on first use.
+
+Usage:
+  python search_index.py build [--templates-dir PATH] [--snapshot DIR] [--out FILE]
+  python search_index.py search ["slack alerts"] [--category C] [--tag T] [--node-type N] [--limit 10]
+                                [--collapse]
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import math
+import struct
+import sys
+import time
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from normalize import derive_category_from_tags_and_text, tokenize
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent / ".corpus" / "search.idx"
+MAGIC = b"N8NSIX1\n"
+
+# Weighted term frequency: a word in the title counts three times, in a tag twice.
+FIELD_WEIGHTS = {"title": 3, "tags": 2, "description": 1, "nodes": 1}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def node_name(node_type: str) -> str:
+    """Short, searchable name of an n8n node type ("n8n-nodes-base.googleSheets" -> "googleSheets")."""
+    return node_type.rsplit(".", 1)[-1]
+
+
+def _split_camel(name: str) -> str:
+    return "".join(f" {c}" if c.isupper() else c for c in name)
+
+
+def _document_terms(row: Dict[str, Any]) -> Dict[str, int]:
+    tf: Dict[str, int] = defaultdict(int)
+    node_text = " ".join(
+        f"{node_name(nt)} {_split_camel(node_name(nt))}" for nt, _ in row.get("node_type_counts") or []
+    )
+    fields = {
+        "title": row.get("title") or "",
+        "tags": " ".join(str(t) for t in row.get("tags") or []),
+        "description": row.get("description") or "",
+        "nodes": node_text,
+    }
+    for field, text in fields.items():
+        weight = FIELD_WEIGHTS[field]
+        for tok in tokenize(text):
+            tf[tok] += weight
+    return tf
+
+
+class SearchIndex:
+    """BM25 inverted index. Build with SearchIndex.build(rows) or load with SearchIndex.load(path)."""
+
+    def __init__(self, header: Dict[str, Any], postings: memoryview) -> None:
+        self.docs: List[Dict[str, Any]] = header["docs"]
+        self.doc_len: List[int] = header["doc_len"]
+        self._terms: Dict[str, List[int]] = header["terms"]
+        self._byteorder = header["byteorder"]
+        self._swap = self._byteorder != sys.byteorder
+        self._postings = postings
+        self._cache: Dict[str, Tuple[array, array]] = {}
+        self._filter_cache: Dict[Tuple[str, str], set] = {}
+
+    # -- building / persistence -------------------------------------------------------
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> "SearchIndex":
+        docs: List[Dict[str, Any]] = []
+        doc_len: List[int] = []
+        post_docs: Dict[str, array] = defaultdict(lambda: array("I"))
+        post_tf: Dict[str, List[int]] = defaultdict(list)
+        for row in rows:
+            ordinal = len(docs)
+            tf = _document_terms(row)
+            for term, freq in tf.items():
+                post_docs[term].append(ordinal)
+                post_tf[term].append(freq)
+            doc_len.append(sum(tf.values()))
+            docs.append(
+                {
+                    "source_id": row.get("source_id"),
+                    "title": row.get("title") or "",
+                    "category": row.get("category") or derive_category_from_tags_and_text(
+                        row.get("tags") or [], row.get("title") or "", row.get("description") or ""
+                    ),
+                    "tags": list(row.get("tags") or []),
+                    "node_types": [nt for nt, _ in row.get("node_type_counts") or []],
+                }
+            )
+        n = len(docs)
+        avgdl = (sum(doc_len) / n) if n else 1.0
+        terms: Dict[str, List[int]] = {}
+        chunks: List[bytes] = []
+        offset = 0
+        for term in sorted(post_docs):
+            d = post_docs[term]
+            idf = math.log(1.0 + (n - len(d) + 0.5) / (len(d) + 0.5))
+            impacts = array(
+                "f",
+                (
+                    idf * tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[doc] / avgdl))
+                    for doc, tf in zip(d, post_tf[term])
+                ),
+            )
+            terms[term] = [offset, len(d)]
+            chunks.append(d.tobytes())
+            chunks.append(impacts.tobytes())
+            offset += len(d) * d.itemsize + len(impacts) * impacts.itemsize
+        header = {"byteorder": sys.byteorder, "docs": docs, "doc_len": doc_len, "terms": terms}
+        return cls(header, memoryview(b"".join(chunks)))
+
+    def save(self, path: Path | str) -> None:
+        header = {"byteorder": self._byteorder, "docs": self.docs, "doc_len": self.doc_len, "terms": self._terms}
+        raw_header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(raw_header)))
+            f.write(raw_header)
+            f.write(self._postings)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path | str = DEFAULT_INDEX_PATH) -> Optional["SearchIndex"]:
+        p = Path(path)
+        if not p.is_file():
+            return None
+        data = p.read_bytes()
+        if not data.startswith(MAGIC):
+            return None
+        (header_len,) = struct.unpack_from("<Q", data, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(data[start : start + header_len])
+        return cls(header, memoryview(data)[start + header_len :])
+
+    @property
+    def term_count(self) -> int:
+        return len(self._terms)
+
+    # -- querying ------------------------------------------------------------------------
+
+    def _posting(self, term: str) -> Optional[Tuple[array, array]]:
+        cached = self._cache.get(term)
+        if cached is not None:
+            return cached
+        entry = self._terms.get(term)
+        if entry is None:
+            return None
+        offset, count = entry
+        docs, impacts = array("I"), array("f")
+        docs.frombytes(self._postings[offset : offset + count * docs.itemsize])
+        start = offset + count * docs.itemsize
+        impacts.frombytes(self._postings[start : start + count * impacts.itemsize])
+        if self._swap:
+            docs.byteswap()
+            impacts.byteswap()
+        self._cache[term] = (docs, impacts)
+        return docs, impacts
+
+    def _filter_ids(self, kind: str, value: str) -> set:
+        key = (kind, value.lower())
+        ids = self._filter_cache.get(key)
+        if ids is None:
+            v = key[1]
+            if kind == "category":
+                ids = {i for i, d in enumerate(self.docs) if d["category"].lower() == v}
+            elif kind == "tag":
+                ids = {i for i, d in enumerate(self.docs) if any(str(t).lower() == v for t in d["tags"])}
+            else:
+                ids = {
+                    i for i, d in enumerate(self.docs)
+                    if any(nt.lower() == v or node_name(nt).lower() == v for nt in d["node_types"])
+                }
+            self._filter_cache[key] = ids
+        return ids
+
+    def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        collapse: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Top `limit` templates for `query` as (score, doc). `filters` may hold "category",
+        "tag" and/or "node_type" (full type or short name); all must match, case-insensitively.
+        `collapse` ({source_id: cluster_id}, see dedup.load_clusters) keeps only the best hit
+        of each near-duplicate cluster. A query without search terms returns the filtered
+        templates in corpus order, all scored 0.
+        """
+        allowed: Optional[set] = None
+        for kind in ("category", "tag", "node_type"):
+            value = (filters or {}).get(kind)
+            if value:
+                ids = self._filter_ids(kind, value)
+                allowed = ids if allowed is None else allowed & ids
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [(0.0, self.docs[doc]) for doc in self._collapse(sorted(allowed or ()), collapse, limit)]
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            if not scores:
+                scores = dict(zip(*posting))
+                continue
+            get = scores.get
+            for doc, impact in zip(*posting):
+                scores[doc] = get(doc, 0.0) + impact
+        if allowed is not None:
+            scores = {doc: scores[doc] for doc in scores.keys() & allowed}
+        if collapse:
+            best = self._collapse(sorted(scores, key=scores.__getitem__, reverse=True), collapse, limit)
+        else:
+            best = heapq.nlargest(limit, scores, key=scores.__getitem__)
+        return [(scores[doc], self.docs[doc]) for doc in best]
+
+    def _collapse(self, ranked: Iterable[int], collapse: Optional[Dict[str, str]], limit: int) -> List[int]:
+        """The first `limit` of `ranked`, keeping one template per cluster when `collapse` is given."""
+        best: List[int] = []
+        seen = set()
+        for doc in ranked:
+            if collapse:
+                source_id = str(self.docs[doc]["source_id"])
+                cluster = collapse.get(source_id, source_id)
+                if cluster in seen:
+                    continue
+                seen.add(cluster)
+            best.append(doc)
+            if len(best) >= limit:
+                break
+        return best
+
+
+def main() -> None:
+    from corpus_snapshot import SNAPSHOT_DIR, load_rows
+
+    ap = argparse.ArgumentParser(description="Build or query the offline template search index.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="Index the local corpus (from the snapshot when available)")
+    p.add_argument("--templates-dir", type=Path, default=None)
+    p.add_argument("--snapshot", type=Path, default=SNAPSHOT_DIR)
+    p.add_argument("--out", type=Path, default=DEFAULT_INDEX_PATH)
+    p = sub.add_parser("search", help="Search the index")
+    p.add_argument("query", nargs="?", default="", help="Search terms (omit to list the templates matching the filters)")
+    p.add_argument("--index", type=Path, default=DEFAULT_INDEX_PATH)
+    p.add_argument("--category", default=None)
+    p.add_argument("--tag", default=None)
+    p.add_argument("--node-type", default=None, help="Full node type or short name (e.g. slack)")
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--collapse", nargs="?", const="", default=None, metavar="CLUSTERS",
+                   help="One hit per near-duplicate cluster (default clusters file: .corpus/clusters.json from dedup.py local)")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        rows = load_rows(args.templates_dir, args.snapshot)
+        index = SearchIndex.build(rows)
+        index.save(args.out)
+        size_mb = args.out.stat().st_size / 1e6
+        print(f"Indexed {len(index.docs)} templates ({index.term_count} terms, {size_mb:.1f} MB) "
+              f"in {time.perf_counter() - started:.2f} s -> {args.out}")
+        return
+
+    index = SearchIndex.load(args.index)
+    if index is None:
+        print(f"No index at {args.index}; run: python search_index.py build")
+        return
+    collapse = None
+    if args.collapse is not None:
+        from dedup import DEFAULT_CLUSTERS_PATH, load_clusters
+
+        collapse = load_clusters(args.collapse or DEFAULT_CLUSTERS_PATH)
+    filters = {"category": args.category, "tag": args.tag, "node_type": args.node_type}
+    started = time.perf_counter()
+    results = index.search(args.query, filters, limit=args.limit, collapse=collapse)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for score, doc in results:
+        print(f"{score:7.2f}  {doc['source_id']:<10} {doc['title'][:70]:<70}  [{doc['category']}]")
+    print(f"{len(results)} results in {elapsed_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,26 @@
 State handling for the n8n template scraper.
 
 We persist progress to a small JSON file so that runs can be resumed later.
+Delta sync (run.py --delta) additionally keeps a snapshot of the last-seen listing
+fields per template id, so unchanged templates are not refetched.
 """
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from json_codec import loads
 
 STATE_PATH = Path(__file__).resolve().parent / ".scraper_state.json"
+LISTING_SNAPSHOT_PATH = Path(__file__).resolve().parent / ".listing_snapshot.json"
+
+# Listing fields that indicate a template changed upstream. totalViews is left out on
+# purpose: it changes every day and would make every template look modified.
+LISTING_SNAPSHOT_FIELDS = ("name", "description")
 
 
 @dataclass
@@ -30,7 +40,7 @@ def load_state() -> Optional[ScraperState]:
     if not STATE_PATH.exists():
         return None
     try:
-        raw = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        raw = loads(STATE_PATH.read_bytes())
         return ScraperState(
             last_source_id=str(raw.get("last_source_id", "")),
             last_run_utc=str(raw.get("last_run_utc", "")),
@@ -54,3 +64,39 @@ def save_state(last_source_id: str, total_synced: int, total_errors: int) -> Non
     )
     STATE_PATH.write_text(json.dumps(asdict(state), indent=2), encoding="utf-8")
 
+
+@dataclass
+class ListingSnapshot:
+    last_full_sweep_utc: str
+    entries: Dict[str, str] = field(default_factory=dict)
+
+
+def listing_fingerprint(item: Dict[str, Any]) -> str:
+    """Short hash of the listing fields we compare between runs."""
+    raw = "\x1f".join(str(item.get(f) or "") for f in LISTING_SNAPSHOT_FIELDS)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def load_listing_snapshot() -> Optional[ListingSnapshot]:
+    """
+    Load the last-seen listing snapshot ({source_id: fingerprint}).
+    Returns None if no snapshot exists or it cannot be parsed.
+    """
+    if not LISTING_SNAPSHOT_PATH.exists():
+        return None
+    try:
+        raw = loads(LISTING_SNAPSHOT_PATH.read_bytes())
+        entries = raw.get("entries") or {}
+        return ListingSnapshot(
+            last_full_sweep_utc=str(raw.get("last_full_sweep_utc", "")),
+            entries={str(k): str(v) for k, v in entries.items()},
+        )
+    except Exception:
+        return None
+
+
+def save_listing_snapshot(snapshot: ListingSnapshot) -> None:
+    """
+    Persist the listing snapshot to disk.
+    """
+    LISTING_SNAPSHOT_PATH.write_text(json.dumps(asdict(snapshot)), encoding="utf-8")
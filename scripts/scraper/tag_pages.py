@@ -0,0 +1,219 @@
+"""
+Regenerate the repository's generated listing pages from the local template corpus:
+  - tags/<tag>.md        every template whose title contains the word, for words in at least
+                         PAGE_MIN_COUNT templates (single characters and numbers excepted)
+  - tag_counts.md        templates per title word, counts > 3 first (linked to their pages)
+  - index_files_N.md     all template files, 1000 per page
+
+A template's words are its normalized title (normalize_from_local_json: meta.name) plus the
+workflow's own name, split with normalize.keyword_tokens, the tokenizer behind
+enrich_metadata's keyword tags. Stopwords are kept: the pages list every title word. Rows
+come from the corpus snapshot when there is one. All postings are computed in one pass,
+every page is rendered in memory, and a page is only written when the SHA-256 of its new
+content differs from the file on disk, so a corpus update touches the pages that actually
+changed instead of all of them. An empty corpus (missing templates dir, no snapshot) is an
+error: nothing is written or pruned.
+
+Usage:
+  python tag_pages.py [--templates-dir PATH] [--snapshot DIR] [--out DIR] [--prune] [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from corpus_snapshot import REPO_ROOT, SNAPSHOT_DIR, TEMPLATES_DIR, CorpusSnapshot, load_rows
+from json_codec import load_path
+from normalize import keyword_tokens
+
+FILE_URL_PREFIX = "https://github.com/zengfr/n8n-workflow-all-templates/blob/main/n8n-workflow-all-templates/"
+INDEX_BATCH_SIZE = 1000
+# Words in at least this many templates get a page (as the published tags/ pages do).
+PAGE_MIN_COUNT = 3
+# tag_counts.md lists words with at least this many templates in its first, linked table.
+LINK_MIN_COUNT = 4
+
+
+class TemplateFile(NamedTuple):
+    id: str
+    name: str
+    url: str
+    path: str
+
+
+def template_file(row: Dict[str, Any]) -> TemplateFile:
+    """Listing entry for one corpus row; the id is the numeric prefix of the file name."""
+    path = PurePosixPath(str(row["path"]).replace("\\", "/"))
+    return TemplateFile(path.name.split("_", 1)[0], path.name, FILE_URL_PREFIX + path.as_posix(), path.as_posix())
+
+
+def _id_key(entry: TemplateFile) -> Tuple[int, str]:
+    return (int(entry.id), entry.path) if entry.id.isdigit() else (1 << 62, entry.path)
+
+
+def load_named_rows(templates_dir: Optional[Path] = None, snapshot_dir: Path = SNAPSHOT_DIR) -> List[Dict[str, Any]]:
+    """load_rows() plus "workflow_name", the raw workflow's top-level name."""
+    snap = CorpusSnapshot.open(snapshot_dir)
+    if snap is not None and (templates_dir is None or snap.meta.get("templates_dir") == str(Path(templates_dir).resolve())):
+        with snap:
+            rows = list(snap.rows())
+            for row in rows:
+                row["workflow_name"] = snap.raw_workflow(row).get("name") or ""
+        return rows
+    if snap is not None:
+        snap.close()
+    root = Path(templates_dir or TEMPLATES_DIR).resolve()
+    rows = load_rows(root, snapshot_dir)
+    for row in rows:
+        row["workflow_name"] = load_path(root / row["path"]).get("name") or ""
+    return rows
+
+
+def collect(rows: Iterable[Dict[str, Any]]) -> Tuple[List[TemplateFile], Dict[str, List[int]]]:
+    """
+    One pass over the corpus: the template files (ordered by path) and, per title word, the
+    positions of the templates containing it.
+    """
+    items = sorted(
+        ((template_file(row), f"{row.get('title') or ''} {row.get('workflow_name') or ''}") for row in rows),
+        key=lambda it: it[0].path,
+    )
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for i, (_, title) in enumerate(items):
+        for tag in dict.fromkeys(keyword_tokens(title)):
+            postings[tag].append(i)
+    return [entry for entry, _ in items], postings
+
+
+def has_page(tag: str, count: int) -> bool:
+    return count >= PAGE_MIN_COUNT and len(tag) > 1 and not tag.isdigit()
+
+
+def render_tag_page(tag: str, entries: List[TemplateFile]) -> str:
+    lines = [f"# {tag} : {len(entries)}", "", "|id|file|", "|----|----|"]
+    lines.extend(f"|{e.id}|[{e.name}]({e.url})|" for e in entries)
+    return "\n".join(lines) + "\n"
+
+
+def render_tag_counts(file_count: int, counts: List[Tuple[str, int]]) -> str:
+    lines = ["# tags for names", "", "## file_counts", f"- {file_count}"]
+    lines += [f"## tag_counts（counts > {LINK_MIN_COUNT - 1}）", "", "| tag | counts |", "|------|----------|"]
+    lines.extend(
+        f"| [{tag}](tags/{tag}.md) | {n} |" if has_page(tag, n) else f"| {tag} | {n} |"
+        for tag, n in counts
+        if n >= LINK_MIN_COUNT
+    )
+    lines += ["", f"## tag_counts（counts ≤ {LINK_MIN_COUNT - 1}）", "", "| tag | counts |", "|------|----------|"]
+    lines.extend(f"| {tag} | {n} |" for tag, n in counts if n < LINK_MIN_COUNT)
+    return "\n".join(lines) + "\n"
+
+
+def render_index_page(batch: int, entries: List[TemplateFile]) -> str:
+    lines = [f"## all files list for batch {batch}", "", "| idx | filename |", "|------|-------------------|"]
+    lines.extend(f"| {e.id} | [{e.name}]({e.url}) |" for e in entries)
+    return "\n".join(lines) + "\n\n"
+
+
+def generate_pages(rows: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """Every generated page as {path relative to the output dir: content}. Raises ValueError on an empty corpus."""
+    entries, postings = collect(rows)
+    if not entries:
+        raise ValueError("no templates: refusing to generate pages from an empty corpus")
+    # Largest first; ties keep the order in which the words first appear in the corpus.
+    counts = Counter({tag: len(ids) for tag, ids in postings.items()}).most_common()
+    pages: Dict[str, str] = {"tag_counts.md": render_tag_counts(len(entries), counts)}
+    for tag, n in counts:
+        if has_page(tag, n):
+            pages[f"tags/{tag}.md"] = render_tag_page(tag, [entries[i] for i in postings[tag]])
+    by_id = sorted(entries, key=_id_key)
+    for batch, start in enumerate(range(0, len(by_id), INDEX_BATCH_SIZE)):
+        pages[f"index_files_{batch + 1}.md"] = render_index_page(batch, by_id[start : start + INDEX_BATCH_SIZE])
+    return pages
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_pages(pages: Dict[str, str], out_dir: Path, prune: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Write the pages whose content hash differs from the file on disk. With prune, also remove
+    tags/*.md and index_files_*.md pages that are no longer generated.
+    Returns counts plus the changed / removed paths.
+    """
+    if "tag_counts.md" not in pages or "index_files_1.md" not in pages:
+        raise ValueError("incomplete page set: refusing to write or prune")
+    changed: List[str] = []
+    unchanged = 0
+    for rel, content in pages.items():
+        data = content.encode("utf-8")
+        target = out_dir / rel
+        try:
+            current = target.read_bytes()
+        except FileNotFoundError:
+            current = None
+        if current is not None and len(current) == len(data) and _digest(current) == _digest(data):
+            unchanged += 1
+            continue
+        changed.append(rel)
+        if not dry_run:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(target.suffix + ".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(target)
+
+    removed: List[str] = []
+    if prune:
+        stale = list((out_dir / "tags").glob("*.md")) + list(out_dir.glob("index_files_*.md"))
+        for path in sorted(stale):
+            rel = path.relative_to(out_dir).as_posix()
+            if rel not in pages:
+                removed.append(rel)
+                if not dry_run:
+                    path.unlink()
+    return {"written": len(changed), "unchanged": unchanged, "removed": len(removed), "changed": changed, "removed_paths": removed}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Regenerate tags/*.md, tag_counts.md and index_files_*.md from the local corpus.")
+    ap.add_argument("--templates-dir", type=Path, default=None)
+    ap.add_argument("--snapshot", type=Path, default=SNAPSHOT_DIR)
+    ap.add_argument("--out", type=Path, default=REPO_ROOT, help="Directory holding tag_counts.md and tags/ (default: repo root)")
+    ap.add_argument("--prune", action="store_true", help="Delete tag and index pages that are no longer generated")
+    ap.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    ap.add_argument("--verbose", "-v", action="store_true", help="List changed and removed pages")
+    args = ap.parse_args()
+
+    if args.templates_dir is not None and not args.templates_dir.is_dir():
+        sys.exit(f"Templates dir not found: {args.templates_dir}")
+    started = time.perf_counter()
+    rows = load_named_rows(args.templates_dir, args.snapshot)
+    if not rows:
+        sys.exit(
+            f"No templates loaded (templates dir {args.templates_dir or TEMPLATES_DIR}, snapshot {args.snapshot}); "
+            "nothing written or pruned"
+        )
+    pages = generate_pages(rows)
+    generated = time.perf_counter()
+    result = write_pages(pages, args.out, prune=args.prune, dry_run=args.dry_run)
+    finished = time.perf_counter()
+    if args.verbose:
+        for rel in result["changed"]:
+            print(f"  M {rel}")
+        for rel in result["removed_paths"]:
+            print(f"  D {rel}")
+    verb = "would write" if args.dry_run else "wrote"
+    print(
+        f"{len(rows)} templates, {len(pages)} pages: {verb} {result['written']}, "
+        f"{result['unchanged']} unchanged, {result['removed']} removed "
+        f"(generate {generated - started:.2f} s, compare/write {finished - generated:.2f} s) -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
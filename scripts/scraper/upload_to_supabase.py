@@ -4,6 +4,7 @@ Uses SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY from env (e.g. .env in scripts/s
 """
 import os
 from pathlib import Path
+from typing import Any, Collection, Iterator
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -21,12 +22,53 @@ def get_client() -> Client:
     return create_client(url, key)
 
 
-def upload_template(client: Client, normalized: dict) -> str | None:
+NODE_TYPES_INSERT_CHUNK = 1000
+SCAN_PAGE_SIZE = 1000
+
+
+def scan_pages(
+    client: Client,
+    table: str,
+    columns: str,
+    key: str = "id",
+    page_size: int = SCAN_PAGE_SIZE,
+    after: Any = None,
+) -> Iterator[list[dict]]:
     """
-    Upsert one template and its node_types. Returns template uuid or None.
-    normalized must have: source_id, title, description, category, tags, nodes, raw_workflow, source_url, node_type_counts.
+    Yield every row of `table` in pages, using keyset pagination on `key`
+    (WHERE key > last ORDER BY key LIMIT page_size) instead of offset ranges.
+    Each page costs the same regardless of position, and rows inserted or deleted
+    mid-scan can't shift later pages. `key` is added to `columns` if missing.
+    The scan only stops on an empty page, so a server-side row cap lower than
+    page_size can't end it early.
+    """
+    wanted = [c.strip() for c in columns.split(",")]
+    select = columns if key in wanted else f"{key},{columns}"
+    last = after
+    while True:
+        query = client.table(table).select(select).order(key).limit(page_size)
+        if last is not None:
+            query = query.gt(key, last)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][key]
+
+
+def scan_table(client: Client, table: str, columns: str, key: str = "id", page_size: int = SCAN_PAGE_SIZE) -> Iterator[dict]:
+    """Yield every row of `table` one at a time (see scan_pages)."""
+    for rows in scan_pages(client, table, columns, key=key, page_size=page_size):
+        yield from rows
+
+
+def _template_row(normalized: dict, existing: Collection[str] | None = None) -> dict:
+    """
+    The templates row for one normalized template. `existing` is None on plain syncs; on
+    refreshes it holds the source_ids already stored. Refresh rows carry content_hash
+    (migration 20250221000001), and rows that already exist leave category and tags out so
+    the upsert keeps what enrich_metadata / ai_categorizer wrote.
     """
-    # Upsert template (id is auto; we match on source_id)
     row = {
         "source_id": normalized["source_id"],
         "title": normalized["title"],
@@ -37,6 +79,21 @@ def upload_template(client: Client, normalized: dict) -> str | None:
         "raw_workflow": normalized["raw_workflow"],
         "source_url": normalized.get("source_url") or "",
     }
+    if existing is not None:
+        row["content_hash"] = normalized.get("content_hash")
+        if str(normalized["source_id"]) in existing:
+            del row["category"], row["tags"]
+    return row
+
+
+def upload_template(client: Client, normalized: dict, existing: Collection[str] | None = None) -> str | None:
+    """
+    Upsert one template and its node_types. Returns template uuid or None.
+    normalized must have: source_id, title, description, category, tags, nodes, raw_workflow, source_url, node_type_counts.
+    existing: source_ids already stored, on refreshes (see _template_row).
+    """
+    # Upsert template (id is auto; we match on source_id)
+    row = _template_row(normalized, existing)
     r = client.table("templates").upsert(row, on_conflict="source_id").execute()
     if not r.data or len(r.data) == 0:
         return None
@@ -51,3 +108,64 @@ def upload_template(client: Client, normalized: dict) -> str | None:
     if rows:
         client.table("node_types").insert(rows).execute()
     return template_id
+
+
+def upload_templates_bulk(
+    client: Client,
+    normalized_list: list[dict],
+    fallback: bool = True,
+    existing: Collection[str] | None = None,
+) -> dict[str, str]:
+    """
+    Upsert a batch of templates and their node_types with a constant number of requests:
+    one multi-row upsert on `templates` (two on refreshes mixing new and existing rows, since
+    every row of a multi-row upsert must have the same columns), one delete of node_types by
+    `template_id in (...)`, and multi-row inserts of the new node_types.
+
+    Pass `existing` (the source_ids already stored) when refreshing: content_hash is then
+    written, and existing rows keep their stored category and tags (see _template_row).
+
+    Returns {source_id: template uuid} for the templates that were written.
+    If the bulk request fails and `fallback` is true, each template is retried with
+    upload_template so one bad row does not lose the whole batch.
+    """
+    # Postgres rejects an upsert that touches the same row twice; last occurrence wins.
+    by_source_id = {str(n["source_id"]): n for n in normalized_list}
+    if not by_source_id:
+        return {}
+    try:
+        groups: dict[bool, list[dict]] = {}
+        for n in by_source_id.values():
+            row = _template_row(n, existing)
+            groups.setdefault("category" in row, []).append(row)
+        ids = {}
+        for rows in groups.values():
+            r = client.table("templates").upsert(rows, on_conflict="source_id").execute()
+            ids.update({str(row["source_id"]): row["id"] for row in r.data or [] if row.get("id")})
+        if not ids:
+            return {}
+
+        client.table("node_types").delete().in_("template_id", list(ids.values())).execute()
+        nt_rows = [
+            {"template_id": template_id, "node_type": nt, "count": c}
+            for source_id, template_id in ids.items()
+            for nt, c in by_source_id[source_id].get("node_type_counts") or []
+        ]
+        for start in range(0, len(nt_rows), NODE_TYPES_INSERT_CHUNK):
+            client.table("node_types").insert(nt_rows[start : start + NODE_TYPES_INSERT_CHUNK]).execute()
+        return ids
+    except Exception as e:  # noqa: BLE001
+        if not fallback:
+            raise
+        print(f"  Bulk upload of {len(by_source_id)} templates failed ({e}); retrying one by one")
+
+    ids = {}
+    for source_id, normalized in by_source_id.items():
+        try:
+            template_id = upload_template(client, normalized, existing)
+        except Exception as e:  # noqa: BLE001
+            print(f"  Error uploading template {source_id}: {e}")
+            continue
+        if template_id:
+            ids[source_id] = template_id
+    return ids
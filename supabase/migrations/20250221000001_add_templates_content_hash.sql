@@ -0,0 +1,8 @@
+-- Add content_hash to templates: SHA-256 of the synced title, description and raw_workflow.
+-- Used by the scraper (run.py --refresh-changed) to skip writes for unchanged templates.
+
+ALTER TABLE public.templates
+  ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+COMMENT ON COLUMN public.templates.content_hash IS
+  'SHA-256 fingerprint of title, description and raw_workflow as normalized by the scraper. Unchanged hash = no upload needed.';
@@ -0,0 +1,48 @@
+-- Bulk write-back of category/tags for enrich_metadata.py.
+-- Takes a JSON array of {id, category?, tags?} and updates each row in its own
+-- subtransaction, so one bad row doesn't fail the whole batch.
+-- Keys that are absent from an element leave that column unchanged.
+
+CREATE OR REPLACE FUNCTION public.bulk_update_template_metadata(updates jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  item jsonb;
+  updated_count int := 0;
+  failed jsonb := '[]'::jsonb;
+BEGIN
+  FOR item IN SELECT * FROM jsonb_array_elements(COALESCE(updates, '[]'::jsonb))
+  LOOP
+    BEGIN
+      UPDATE public.templates
+      SET
+        category = CASE WHEN item ? 'category' THEN item->>'category' ELSE category END,
+        tags = CASE
+          WHEN item ? 'tags' THEN ARRAY(SELECT jsonb_array_elements_text(item->'tags'))
+          ELSE tags
+        END,
+        updated_at = NOW()
+      WHERE id = (item->>'id')::uuid;
+
+      IF FOUND THEN
+        updated_count := updated_count + 1;
+      ELSE
+        failed := failed || jsonb_build_object('id', item->>'id', 'error', 'not found');
+      END IF;
+    EXCEPTION WHEN others THEN
+      failed := failed || jsonb_build_object('id', item->>'id', 'error', SQLERRM);
+    END;
+  END LOOP;
+
+  RETURN jsonb_build_object('updated', updated_count, 'failed', failed);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.bulk_update_template_metadata(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bulk_update_template_metadata(jsonb) TO service_role;
+
+COMMENT ON FUNCTION public.bulk_update_template_metadata(jsonb) IS
+  'Updates category/tags for a JSON array of {id, category?, tags?}. Each row is isolated; returns {updated, failed: [{id, error}]}.';
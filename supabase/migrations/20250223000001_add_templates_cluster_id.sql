@@ -0,0 +1,13 @@
+-- Add cluster_id to templates: near-duplicate cluster from scripts/scraper/dedup.py.
+-- NULL for unique templates; for every member of a cluster, the source_id of its
+-- representative (the lowest source_id in the cluster, which has cluster_id = source_id).
+
+ALTER TABLE public.templates
+  ADD COLUMN IF NOT EXISTS cluster_id TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_templates_cluster_id
+  ON public.templates (cluster_id)
+  WHERE cluster_id IS NOT NULL;
+
+COMMENT ON COLUMN public.templates.cluster_id IS
+  'Near-duplicate cluster (MinHash/LSH over workflow structure): source_id of the cluster representative, NULL when unique.';
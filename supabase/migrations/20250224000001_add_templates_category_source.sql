@@ -0,0 +1,56 @@
+-- Add category_source to templates: which step of scripts/scraper/enrich_metadata.py
+-- wrote the category ('rules' for API categories / keyword matching, 'ai', 'pre_classifier').
+-- NULL for rows not categorized by enrich_metadata since this migration.
+-- pre_classifier.py train skips 'pre_classifier' rows so the model never learns its own labels.
+
+ALTER TABLE public.templates
+  ADD COLUMN IF NOT EXISTS category_source TEXT;
+
+COMMENT ON COLUMN public.templates.category_source IS
+  'Origin of templates.category as written by enrich_metadata.py: rules, ai or pre_classifier; NULL when unknown.';
+
+-- bulk_update_template_metadata also writes category_source when an element has it.
+CREATE OR REPLACE FUNCTION public.bulk_update_template_metadata(updates jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  item jsonb;
+  updated_count int := 0;
+  failed jsonb := '[]'::jsonb;
+BEGIN
+  FOR item IN SELECT * FROM jsonb_array_elements(COALESCE(updates, '[]'::jsonb))
+  LOOP
+    BEGIN
+      UPDATE public.templates
+      SET
+        category = CASE WHEN item ? 'category' THEN item->>'category' ELSE category END,
+        category_source = CASE WHEN item ? 'category_source' THEN item->>'category_source' ELSE category_source END,
+        tags = CASE
+          WHEN item ? 'tags' THEN ARRAY(SELECT jsonb_array_elements_text(item->'tags'))
+          ELSE tags
+        END,
+        updated_at = NOW()
+      WHERE id = (item->>'id')::uuid;
+
+      IF FOUND THEN
+        updated_count := updated_count + 1;
+      ELSE
+        failed := failed || jsonb_build_object('id', item->>'id', 'error', 'not found');
+      END IF;
+    EXCEPTION WHEN others THEN
+      failed := failed || jsonb_build_object('id', item->>'id', 'error', SQLERRM);
+    END;
+  END LOOP;
+
+  RETURN jsonb_build_object('updated', updated_count, 'failed', failed);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.bulk_update_template_metadata(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bulk_update_template_metadata(jsonb) TO service_role;
+
+COMMENT ON FUNCTION public.bulk_update_template_metadata(jsonb) IS
+  'Updates category/category_source/tags for a JSON array of {id, category?, category_source?, tags?}. Each row is isolated; returns {updated, failed: [{id, error}]}.';